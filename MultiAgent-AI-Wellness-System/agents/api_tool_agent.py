@@ -1,10 +1,67 @@
 # API Tool Agent for external food database lookups
+import asyncio
+import contextvars
+import re
 import requests
 import json
-from openai import OpenAI
-from app.config import settings
+from concurrent.futures import ThreadPoolExecutor
+from tools.llm import cached_chat_text, acached_chat_text
+from tools.events import emit
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+MAX_FOOD_ITEMS = 8
+NUTRIENT_FIELDS = ("calories_per_serving", "protein_g", "carbs_g", "fat_g", "fiber_g")
+
+# "calories in 2 slices of pizza, an apple?" -> "2 slices of pizza, an apple"
+_FOOD_QUESTION = re.compile(
+    r"\b(?:calories|protein|carbs|fat|macros|nutrition facts|nutritional value|nutrition info)"
+    r"\s+(?:are\s+|is\s+)?(?:in|of|for)\s+(.+)",
+    re.IGNORECASE,
+)
+# Only unambiguous list separators: "and", "with" and "&" also join dish names
+# ("mac and cheese", "fish and chips"), so tails using them go to the LLM
+_ITEM_SEPARATORS = re.compile(r"\s*[,;+]\s*")
+_AMBIGUOUS = re.compile(r"\band\b|\bwith\b|&|\bplus\b", re.IGNORECASE)
+# "my lunch", "my cutting diet": not a food name the database can look up
+_NOT_A_FOOD = re.compile(r"^(?:my|your|our|this|that|today'?s?)\b", re.IGNORECASE)
+_LEADING_ARTICLE = re.compile(r"^(?:an?|the|some)\s+", re.IGNORECASE)
+
+
+def parse_food_items(message: str) -> list | None:
+    """Food items from a "calories in X, Y" style question, or None when
+    the message needs the LLM to pick them out"""
+    match = _FOOD_QUESTION.search(message)
+    if not match:
+        return None
+    tail = re.split(r"[?!.]", match.group(1))[0].strip()
+    if _AMBIGUOUS.search(tail) or _NOT_A_FOOD.match(tail):
+        return None
+    items = [_LEADING_ARTICLE.sub("", item).strip() for item in _ITEM_SEPARATORS.split(tail)]
+    items = [item for item in items if item]
+    # Long fragments are usually the rest of a sentence, not a food
+    if not items or len(items) > MAX_FOOD_ITEMS or any(len(item.split()) > 5 for item in items):
+        return None
+    return items
+
+
+def merge_food_data(results: list) -> dict:
+    """Combine per-item lookups into one record with summed nutrients"""
+    if len(results) == 1:
+        return results[0]
+    merged = {
+        "food_name": " + ".join(str(r.get("food_name", "unknown food")) for r in results),
+        "serving_size": "; ".join(str(r.get("serving_size", "1 serving")) for r in results),
+        "source": ", ".join(sorted({str(r.get("source", "Database")) for r in results})),
+        "items": results,
+    }
+    for field in NUTRIENT_FIELDS:
+        total = 0.0
+        for r in results:
+            try:
+                total += float(r.get(field) or 0)
+            except (TypeError, ValueError):
+                pass
+        merged[field] = round(total, 1)
+    return merged
 
 class APIToolAgent:
     """Agent that handles external API calls for food database lookups"""
@@ -20,18 +77,39 @@ class APIToolAgent:
         Look up food information from external database
         Returns structured food data with calories and macros
         """
-        import streamlit as st
-        st.write(f"🔍 API TOOL: Looking up food data for '{food_query}'")
+        emit(f"🔍 API TOOL: Looking up food data for '{food_query}'")
         
         if self.use_mock:
             return self._mock_food_lookup(food_query)
         else:
             return self._real_food_lookup(food_query)
     
-    def _mock_food_lookup(self, food_query: str) -> dict:
-        """Mock food database lookup using LLM to simulate API response"""
+    async def alookup_food(self, food_query: str) -> dict:
+        """Async lookup_food"""
+        emit(f"🔍 API TOOL: Looking up food data for '{food_query}'")
         
-        prompt = f"""
+        # _real_food_lookup falls back to the mock for now
+        return await self._amock_food_lookup(food_query)
+    
+    def lookup_foods(self, items: list) -> dict:
+        """
+        Look up each food item concurrently and merge the results.
+        Every item is its own cache entry, so repeated foods are free.
+        """
+        if len(items) <= 1:
+            return merge_food_data([self.lookup_food(item) for item in items or [""]])
+        # Each worker gets a copy of the caller's context so spans and event sinks carry over
+        with ThreadPoolExecutor(max_workers=len(items)) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, self.lookup_food, item) for item in items]
+            return merge_food_data([f.result() for f in futures])
+    
+    async def alookup_foods(self, items: list) -> dict:
+        """Async lookup_foods"""
+        results = await asyncio.gather(*(self.alookup_food(item) for item in items or [""]))
+        return merge_food_data(list(results))
+    
+    def _food_lookup_prompt(self, food_query: str) -> str:
+        return f"""
         You are a food database API. Return realistic nutrition data for: "{food_query}"
         
         Respond with this exact JSON format:
@@ -50,44 +128,58 @@ class APIToolAgent:
         - 1 medium apple: 95 calories, 0.5g protein, 25g carbs, 0.3g fat, 4g fiber
         - 2 pizza slices: 570 calories, 24g protein, 72g carbs, 20g fat, 4g fiber
         """
+    
+    def _parse_food_data(self, result_text: str) -> dict:
+        # Extract JSON from response
+        import re
+        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+        if json_match:
+            result_text = json_match.group()
+        
+        food_data = json.loads(result_text)
+        
+        emit(f"✅ API TOOL: Found data for {food_data.get('food_name', 'unknown food')}")
+        
+        return food_data
+    
+    def _fallback_food_data(self, food_query: str, error: Exception) -> dict:
+        emit(f"❌ API TOOL: Lookup failed: {error}")
         
+        # Return default data if lookup fails
+        return {
+            "food_name": food_query,
+            "serving_size": "1 serving",
+            "calories_per_serving": 0,
+            "protein_g": 0,
+            "carbs_g": 0,
+            "fat_g": 0,
+            "fiber_g": 0,
+            "source": "Fallback data"
+        }
+    
+    def _mock_food_lookup(self, food_query: str) -> dict:
+        """Mock food database lookup using LLM to simulate API response"""
         try:
-            response = client.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
+            reply = cached_chat_text(
+                "api_tool.food_lookup", "v1", food_query, self._food_lookup_prompt(food_query),
                 temperature=0.1
             )
-            
-            result_text = response.choices[0].message.content.strip()
-            
-            # Extract JSON from response
-            import re
-            json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-            if json_match:
-                result_text = json_match.group()
-            
-            food_data = json.loads(result_text)
-            
-            import streamlit as st
-            st.write(f"✅ API TOOL: Found data for {food_data.get('food_name', 'unknown food')}")
-            
-            return food_data
+            return self._parse_food_data(reply.strip())
             
         except Exception as e:
-            import streamlit as st
-            st.write(f"❌ API TOOL: Lookup failed: {e}")
+            return self._fallback_food_data(food_query, e)
+    
+    async def _amock_food_lookup(self, food_query: str) -> dict:
+        """Async _mock_food_lookup"""
+        try:
+            reply = await acached_chat_text(
+                "api_tool.food_lookup", "v1", food_query, self._food_lookup_prompt(food_query),
+                temperature=0.1
+            )
+            return self._parse_food_data(reply.strip())
             
-            # Return default data if lookup fails
-            return {
-                "food_name": food_query,
-                "serving_size": "1 serving",
-                "calories_per_serving": 0,
-                "protein_g": 0,
-                "carbs_g": 0,
-                "fat_g": 0,
-                "fiber_g": 0,
-                "source": "Fallback data"
-            }
+        except Exception as e:
+            return self._fallback_food_data(food_query, e)
     
     def _real_food_lookup(self, food_query: str) -> dict:
         """Real API lookup (requires API key)"""
@@ -95,32 +187,57 @@ class APIToolAgent:
         # For now, falls back to mock
         return self._mock_food_lookup(food_query)
     
-    def extract_food_items(self, message: str) -> str:
-        """Extract food items from user message for API lookup"""
-        
-        prompt = f"""
+    def _extract_prompt(self, message: str) -> str:
+        return f"""
         Extract the food items from this message for database lookup: "{message}"
         
-        Return just the food items in a simple format, like:
-        - "2 slices pizza"
-        - "1 medium apple"
-        - "chicken breast 6oz"
-        
-        If multiple items, separate with commas.
+        Respond with this exact JSON format, one entry per food with its quantity.
+        Keep a dish as one item, e.g. "mac and cheese" or "fish and chips".
+        Leave out anything that is not a food, e.g. "my diet".
+        {{"items": ["2 slices pizza", "1 medium apple", "chicken breast 6oz"]}}
         """
-        
+    
+    def _parse_items(self, reply: str, message: str) -> list:
+        match = re.search(r'\{.*\}', reply, re.DOTALL)
+        items = json.loads(match.group() if match else reply).get("items", [])
+        items = [str(item).strip() for item in items if str(item).strip()][:MAX_FOOD_ITEMS]
+        return items or [message]
+    
+    def extract_food_items(self, message: str) -> list:
+        """Extract food items from user message for API lookup"""
+        items = parse_food_items(message)
+        if items is not None:
+            emit(f"🔍 API TOOL: Parsed food items locally: {items}")
+            return items
+        try:
+            reply = cached_chat_text(
+                "api_tool.extract_food_items", "v2", message, self._extract_prompt(message),
+                temperature=0.1
+            )
+            
+            return self._parse_items(reply, message)
+            
+        except Exception as e:
+            # Fallback: look up the original message as one item
+            return [message]
+    
+    async def aextract_food_items(self, message: str) -> list:
+        """Async extract_food_items"""
+        items = parse_food_items(message)
+        if items is not None:
+            emit(f"🔍 API TOOL: Parsed food items locally: {items}")
+            return items
         try:
-            response = client.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
+            reply = await acached_chat_text(
+                "api_tool.extract_food_items", "v2", message, self._extract_prompt(message),
                 temperature=0.1
             )
             
-            return response.choices[0].message.content.strip()
+            return self._parse_items(reply, message)
             
         except Exception as e:
-            # Fallback: return original message
-            return message
+            # Fallback: look up the original message as one item
+            return [message]
     
     def needs_food_lookup(self, message: str) -> bool:
         """Determine if message needs food database lookup"""
@@ -133,4 +250,4 @@ class APIToolAgent:
         ]
         
         message_lower = message.lower()
-        return any(keyword in message_lower for keyword in lookup_keywords)
\ No newline at end of file
+        return any(keyword in message_lower for keyword in lookup_keywords)
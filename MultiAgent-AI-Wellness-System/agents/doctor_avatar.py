@@ -1,15 +1,17 @@
 # Doctor avatar agent
-from openai import OpenAI
-from app.config import settings
+import asyncio
+
+from tools.llm import UNAVAILABLE_REPLY, stream_text, astream_text
 from tools.rag import search
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 DISCLAIMER = "⚠️ I’m not a doctor. This is educational only."
+LABEL = "🩺 *[Doctor]*\n"
 
 class DoctorAgent:
     """Health Q&A agent using RAG search."""
 
-    def respond(self, question: str, user: str = None) -> str:
+    def _prompt(self, question: str, user: str = None, conversation: str = "") -> str:
+        """Build the health prompt from the user's profile and RAG context"""
         # Get user profile for personalized advice
         profile_context = ""
         if user:
@@ -32,25 +34,44 @@ User Profile Context:
 """
         
         # Retrieve context from knowledge base
-        context_docs = "\n".join(search(question))
+        context_docs = "\n".join(search(question, domain="health"))
         
-        prompt = (
+        return (
             f"You are a health assistant. {DISCLAIMER}\n\n"
             f"User says: '{question}'\n\n"
             f"{profile_context}\n"
+            f"{conversation}"
             f"Context: {context_docs}\n\n"
             f"Give a concise, helpful response (2-3 sentences max). "
             f"Address their specific concern with practical tips. "
             f"Remind them to consult healthcare professionals for serious concerns."
         )
 
-        reply = client.chat.completions.create(
-            model=settings.CHAT_MODEL,
-            messages=[{"role": "user", "content": prompt}],
+    def respond(self, question: str, user: str = None, on_token=None, conversation: str = "") -> str:
+        """Answer question; with on_token, the labelled reply is streamed to it as it's generated"""
+        prompt = self._prompt(question, user, conversation)
+
+        if on_token:
+            on_token(LABEL)
+        reply = stream_text(
+            "doctor.respond", prompt, on_token, fallback=UNAVAILABLE_REPLY,
             temperature=0.3  # Lower temperature for more consistent responses
-        ).choices[0].message.content
+        )
 
-        reply = f"🩺 *[Doctor]*\n{reply}"
+        reply = f"{LABEL}{reply}"
 
         return reply
 
+    async def arespond(self, question: str, user: str = None, on_token=None, conversation: str = "") -> str:
+        # DB and retrieval are blocking; keep them off the event loop
+        prompt = await asyncio.to_thread(self._prompt, question, user, conversation)
+
+        if on_token:
+            on_token(LABEL)
+        reply = await astream_text(
+            "doctor.respond", prompt, on_token, fallback=UNAVAILABLE_REPLY,
+            temperature=0.3  # Lower temperature for more consistent responses
+        )
+
+        return f"{LABEL}{reply}"
+
@@ -1,16 +1,18 @@
 # Fitness coaching agent
-from openai import OpenAI
-from app.config import settings
+import asyncio
+
+from tools.llm import UNAVAILABLE_REPLY, stream_text, astream_text
 from tools.db import Workout, get_session
+from tools.events import emit
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+LABEL = "🏋️ *[Fitness Coach]*\n"
 
 class FitnessCoachAgent:
     """Motivational workout advisor."""
 
-    def respond(self, user: str, message: str) -> str:
-        import streamlit as st
-        st.write(f"🏋️ FITNESS COACH: Responding to user '{user}'")
+    def _prompt(self, user: str, message: str, conversation: str = "") -> str:
+        """Build the coaching prompt from the user's profile and RAG context"""
+        emit(f"🏋️ FITNESS COACH: Responding to user '{user}'")
         
         # Get user profile for personalized advice
         from tools.db import get_session, UserProfile
@@ -20,7 +22,7 @@ class FitnessCoachAgent:
         with get_session() as s:
             profile = s.exec(select(UserProfile).where(UserProfile.user == user)).first()
             if profile:
-                st.write(f"🏋️ FITNESS COACH: Using profile - Goal: {profile.primary_goal}")
+                emit(f"🏋️ FITNESS COACH: Using profile - Goal: {profile.primary_goal}")
                 profile_context = f"""
 User Profile Context:
 - Age: {profile.age}, Gender: {profile.gender}
@@ -31,35 +33,49 @@ User Profile Context:
 - Health Conditions: {profile.health_conditions or 'none'}
 """
             else:
-                st.write(f"🏋️ FITNESS COACH: No profile found")
+                emit(f"🏋️ FITNESS COACH: No profile found")
         
-        st.write("🏋️ FITNESS COACH: Generating response...")
+        emit("🏋️ FITNESS COACH: Generating response...")
         
         # Retrieve relevant fitness context
         from tools.rag import search
-        context_docs = "\n".join(search(f"fitness {message}"))
+        context_docs = "\n".join(search(message, domain="fitness"))
         
-        prompt = (
+        return (
             f"You are a fitness coach. User says: '{message}'\n\n"
             f"{profile_context}\n"
+            f"{conversation}"
             f"Context: {context_docs}\n\n"
             f"Give a concise, actionable response (2-3 sentences max). "
             f"Be specific and encouraging. Tailor to their fitness level and goals. "
             f"Focus on safety and proper form."
         )
-        
-        reply = client.chat.completions.create(
-            model=settings.CHAT_MODEL,
-            messages=[{"role": "user", "content": prompt}]
-        ).choices[0].message.content
 
-        reply = f"🏋️ *[Fitness Coach]*\n{reply}"
+    def _finish(self, user: str, message: str, reply: str) -> str:
+        """Label the reply and log the workout entry"""
+        reply = f"{LABEL}{reply}"
 
         # Log workout entry
         with get_session() as s:
             s.add(Workout(user=user, description=message.strip()))
             s.commit()
-        st.write("🏋️ FITNESS COACH: Response generated and logged")
+        emit("🏋️ FITNESS COACH: Response generated and logged")
 
         return reply
 
+    def respond(self, user: str, message: str, on_token=None, conversation: str = "") -> str:
+        """Reply to message; with on_token, the labelled reply is streamed to it as it's generated"""
+        prompt = self._prompt(user, message, conversation)
+        if on_token:
+            on_token(LABEL)
+        reply = stream_text("fitness.respond", prompt, on_token, fallback=UNAVAILABLE_REPLY)
+        return self._finish(user, message, reply)
+
+    async def arespond(self, user: str, message: str, on_token=None, conversation: str = "") -> str:
+        # DB and retrieval are blocking; keep them off the event loop
+        prompt = await asyncio.to_thread(self._prompt, user, message, conversation)
+        if on_token:
+            on_token(LABEL)
+        reply = await astream_text("fitness.respond", prompt, on_token, fallback=UNAVAILABLE_REPLY)
+        return await asyncio.to_thread(self._finish, user, message, reply)
+
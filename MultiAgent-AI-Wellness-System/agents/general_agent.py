@@ -1,8 +1,5 @@
 # General agent for out-of-domain queries
-from openai import OpenAI
-from app.config import settings
-
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+from tools.llm import chat
 
 class GeneralAgent:
     """Handles queries outside fitness, nutrition, and health domains."""
@@ -19,9 +16,9 @@ class GeneralAgent:
             "If NO, respond with 'OUT_OF_DOMAIN'."
         )
         
-        analysis = client.chat.completions.create(
-            model=settings.CHAT_MODEL,
-            messages=[{"role": "user", "content": analysis_prompt}]
+        analysis = chat(
+            "general_agent.respond",
+            [{"role": "user", "content": analysis_prompt}]
         ).choices[0].message.content.strip()
 
         if analysis in ["FITNESS", "NUTRITION", "HEALTH"]:
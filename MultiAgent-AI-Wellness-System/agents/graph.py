@@ -1,5 +1,9 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+from langgraph.config import get_config, get_stream_writer
 from langgraph.graph import StateGraph, END
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 from agents.router import RouterAgent
 from agents.fitness_coach import FitnessCoachAgent
@@ -8,12 +12,34 @@ from agents.doctor_avatar import DoctorAgent
 from agents.tracking_viz import TrackingAgent
 from agents.general_agent import GeneralAgent
 from agents.api_tool_agent import APIToolAgent
+from app.config import settings
+from tools.tracing import tracer
+from tools.events import emit
+from tools.memory import format_conversation, recent_messages
 
 
 # 🧠 Shared state definition
+# Nodes return only the fields they change, so each step's update stays small
+# however long the conversation history gets.
 class GraphState(BaseModel):
     user: str = Field(default="")
-    messages: list = Field(default_factory=list)
+    user_message: str = Field(default="")
+    intent: str = Field(default="")
+    # Router's distribution over fitness/nutrition/health/misc for the message
+    intent_scores: dict = Field(default_factory=dict)
+    # Food items the nutrition node wants looked up, and the merged result
+    food_query: list = Field(default_factory=list)
+    food_data: dict | None = Field(default=None)
+    reply: str = Field(default="")
+    # Earlier turns as {"role": "user" | "assistant", "content": ...}, oldest first,
+    # and a summary of the turns before those (see tools/memory.py)
+    history: list = Field(default_factory=list)
+    summary: str = Field(default="")
+
+    @field_validator("history")
+    @classmethod
+    def _bound_history(cls, history: list) -> list:
+        return recent_messages(history)
 
 
 # 🧩 Instantiate agents
@@ -27,217 +53,243 @@ api_tool = APIToolAgent()
 
 
 # 🧠 Helper functions
-def get_user_message(state: GraphState) -> str:
-    """Extract the original user message from state"""
-    for msg in state.messages:
-        if msg.get("role") == "user":
-            return msg["content"]
-    return ""
-
-def get_next_node(state: GraphState) -> str:
-    """Determine next node from state messages"""
-    for msg in reversed(state.messages):
-        if msg.get("role") == "next_node":
-            return msg["content"]
-    return "__end__"
-
-# 🧠 Node wrappers — each node must be callable
-def router_node(state: GraphState) -> GraphState:
-    user_message = state.messages[-1]["content"]
-    import streamlit as st
-    st.write(f"📍 GRAPH: Processing message")
-    
-    intent = router.route(user_message)
-    st.write(f"➡️ GRAPH: Routing to '{intent}' agent")
-    
-    state.messages.append({"role": "system", "content": f"Intent detected: {intent}"})
-    state.messages.append({"role": "next_node", "content": intent})
-    
-    return state
-
-
-def fitness_node(state: GraphState) -> GraphState:
-    user = state.user
-    # Get the original user message, not the routing decision
-    user_msg = None
-    for msg in state.messages:
-        if msg.get("role") == "user":
-            user_msg = msg["content"]
-    
-    reply = fitness.respond(user, user_msg)
-    state.messages.append({"role": "assistant", "content": reply})
-    
-    return state
-
-
-def nutrition_node(state: GraphState) -> GraphState:
-    user = state.user
-    user_msg = get_user_message(state)
-    
-    import streamlit as st
-    st.write(f"🍎 NUTRITION: Processing message")
-    
+def reroute_target(state: GraphState) -> str | None:
+    """Domain a misc message should go to instead, judged from the router's scores"""
+    scores = state.intent_scores or router.distribution(state.user_message, "misc")
+    domain = max(("fitness", "nutrition", "health"), key=lambda d: scores.get(d, 0.0))
+    if scores.get(domain, 0.0) >= settings.REROUTE_MIN_SCORE:
+        return domain
+    return None
+
+def conversation(state: GraphState) -> str:
+    """The conversation so far, formatted for an agent prompt"""
+    return format_conversation(state.summary, state.history)
+
+def token_writer():
+    """Callback forwarding reply tokens to the graph's custom stream.
+
+    None unless the run was started with configurable stream_tokens, so
+    plain invoke() keeps making non-streaming LLM calls.
+    """
+    if not get_config().get("configurable", {}).get("stream_tokens"):
+        return None
+    writer = get_stream_writer()
+    return lambda text: writer({"token": text})
+
+# 🧠 Node wrappers — each returns the state fields it updates
+def router_node(state: GraphState) -> dict:
+    emit(f"📍 GRAPH: Processing message")
+
+    intent = router.route(state.user_message)
+    emit(f"➡️ GRAPH: Routing to '{intent}' agent")
+
+    return {"intent": intent, "intent_scores": router.distribution(state.user_message, intent)}
+
+
+def fitness_node(state: GraphState) -> dict:
+    reply = fitness.respond(state.user, state.user_message, on_token=token_writer(), conversation=conversation(state))
+    return {"reply": reply}
+
+
+def nutrition_node(state: GraphState) -> dict:
+    user_msg = state.user_message
+
+    emit(f"🍎 NUTRITION: Processing message")
+
     # Check if this needs food database lookup
     if api_tool.needs_food_lookup(user_msg):
-        st.write(f"🍎 NUTRITION: Requesting API food lookup")
-        
-        # Extract food items for lookup
-        food_items = api_tool.extract_food_items(user_msg)
-        
-        # Request API lookup
-        state.messages.append({"role": "food_lookup_request", "content": food_items})
-        state.messages.append({"role": "next_node", "content": "api_tool"})
-        
-        return state
-    else:
-        # Regular nutrition response without API lookup
-        st.write(f"🍎 NUTRITION: Providing standard response")
-        reply = nutrition.respond(user, user_msg)
-        state.messages.append({"role": "assistant", "content": reply})
-        # Explicitly set next_node to END for proper routing
-        state.messages.append({"role": "next_node", "content": "__end__"})
-        
-        return state
-
-
-def doctor_node(state: GraphState) -> GraphState:
-    # Get the original user message, not the routing decision
-    user_msg = None
-    for msg in state.messages:
-        if msg.get("role") == "user":
-            user_msg = msg["content"]
-    
-    reply = doctor.respond(user_msg, state.user)
-    state.messages.append({"role": "assistant", "content": reply})
-    
-    return state
-
-
-def tracking_node(state: GraphState) -> GraphState:
-    user = state.user
-    reply = tracking.summarize(user)
-    state.messages.append({"role": "assistant", "content": reply})
-    return state
-
-
-def api_tool_node(state: GraphState) -> GraphState:
-    import streamlit as st
-    st.write(f"🔍 API TOOL: Processing food lookup request")
-    
-    # Get the food query from nutrition agent
-    food_query = None
-    for msg in reversed(state.messages):
-        if msg.get("role") == "food_lookup_request":
-            food_query = msg["content"]
-            break
-    
-    if food_query:
-        # Look up food data
-        food_data = api_tool.lookup_food(food_query)
-        state.messages.append({"role": "food_data", "content": food_data})
-        state.messages.append({"role": "next_node", "content": "nutrition_with_data"})
-        
-        st.write(f"🔍 API TOOL: Lookup complete, returning to nutrition agent")
-    else:
-        st.write(f"❌ API TOOL: No food query found")
-        state.messages.append({"role": "next_node", "content": "nutrition_with_data"})
-    
-    return state
-
-
-def nutrition_with_data_node(state: GraphState) -> GraphState:
-    user = state.user
-    user_msg = get_user_message(state)
-    
-    import streamlit as st
-    st.write(f"🍎 NUTRITION: Generating response with API data")
-    
-    # Get the API data
-    food_data = None
-    for msg in reversed(state.messages):
-        if msg.get("role") == "food_data":
-            food_data = msg["content"]
-            break
-    
+        emit(f"🍎 NUTRITION: Requesting API food lookup")
+
+        # Extract food items and request an API lookup
+        return {"food_query": api_tool.extract_food_items(user_msg)}
+
+    # Regular nutrition response without API lookup
+    emit(f"🍎 NUTRITION: Providing standard response")
+    reply = nutrition.respond(state.user, user_msg, on_token=token_writer(), conversation=conversation(state))
+    return {"reply": reply}
+
+
+def doctor_node(state: GraphState) -> dict:
+    reply = doctor.respond(state.user_message, state.user, on_token=token_writer(), conversation=conversation(state))
+    return {"reply": reply}
+
+
+def tracking_node(state: GraphState) -> dict:
+    return {"reply": tracking.summarize(state.user)}
+
+
+def api_tool_node(state: GraphState) -> dict:
+    emit(f"🔍 API TOOL: Processing food lookup request")
+
+    if not state.food_query:
+        emit(f"❌ API TOOL: No food query found")
+        return {}
+
+    # Look up food data for the nutrition agent
+    food_data = api_tool.lookup_foods(state.food_query)
+    emit(f"🔍 API TOOL: Lookup complete, returning to nutrition agent")
+    return {"food_data": food_data}
+
+
+def nutrition_with_data_node(state: GraphState) -> dict:
+    emit(f"🍎 NUTRITION: Generating response with API data")
+
     # Generate response with real data
-    if food_data:
-        reply = nutrition.respond_with_api_data(user, user_msg, food_data)
+    if state.food_data:
+        reply = nutrition.respond_with_api_data(
+            state.user, state.user_message, state.food_data, on_token=token_writer(), conversation=conversation(state)
+        )
     else:
         # Fallback to regular response
-        reply = nutrition.respond(user, user_msg)
-    
-    state.messages.append({"role": "assistant", "content": reply})
-    
-    return state
+        reply = nutrition.respond(state.user, state.user_message, on_token=token_writer(), conversation=conversation(state))
+
+    return {"reply": reply}
 
 
-def general_node(state: GraphState) -> GraphState:
-    msg = state.messages[-1]["content"]
-    
+OUT_OF_DOMAIN_REPLY = (
+    f"🤖 *[Domain Helper]*\n"
+    f"I'm specialized in fitness 🏋️, nutrition 🍎, and health 🩺 topics. "
+    f"Your question seems to be outside these areas. "
+    f"Could you ask me something related to workouts, meals, or health instead?"
+)
+
+
+def general_node(state: GraphState) -> dict:
+    msg = state.user_message
+
     # Check if this should be re-routed
-    analysis_prompt = (
-        f"Analyze this user message: '{msg}'\n\n"
-        "Could this message be related to:\n"
-        "- FITNESS (workouts, exercise, physical activity, sports, training)\n"
-        "- NUTRITION (food, meals, eating, diet, calories, hunger)\n" 
-        "- HEALTH (medical concerns, symptoms, mental health, anxiety, stress, sleep)\n\n"
-        "If YES, respond with just: fitness, nutrition, or health\n"
-        "If NO, respond with: out_of_domain"
-    )
-    
-    from openai import OpenAI
-    from app.config import settings
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    
-    analysis = client.chat.completions.create(
-        model=settings.CHAT_MODEL,
-        messages=[{"role": "user", "content": analysis_prompt}]
-    ).choices[0].message.content.strip().lower()
+    analysis = reroute_target(state) or "out_of_domain"
 
     if analysis in ["fitness", "nutrition", "health"]:
         # Re-route to the correct agent
         if analysis == "fitness":
-            reply = fitness.respond(state.user, msg)
+            reply = fitness.respond(state.user, msg, conversation=conversation(state))
         elif analysis == "nutrition":
-            reply = nutrition.respond(state.user, msg)
+            reply = nutrition.respond(state.user, msg, conversation=conversation(state))
         elif analysis == "health":
-            reply = doctor.respond(msg)
-        
+            reply = doctor.respond(msg, conversation=conversation(state))
+
         # Add a note about the re-routing
         reply = f"🔄 *[Re-routed to {analysis.title()}]*\n{reply}"
     else:
         # Handle out-of-domain queries
-        reply = (
-            f"🤖 *[Domain Helper]*\n"
-            f"I'm specialized in fitness 🏋️, nutrition 🍎, and health 🩺 topics. "
-            f"Your question seems to be outside these areas. "
-            f"Could you ask me something related to workouts, meals, or health instead?"
+        reply = OUT_OF_DOMAIN_REPLY
+
+    return {"reply": reply}
+
+
+# ⚡ Async node variants — same state transitions, non-blocking LLM calls.
+# Blocking DB work runs in worker threads via asyncio.to_thread.
+async def arouter_node(state: GraphState) -> dict:
+    emit(f"📍 GRAPH: Processing message")
+
+    intent = await router.aroute(state.user_message)
+    emit(f"➡️ GRAPH: Routing to '{intent}' agent")
+
+    return {"intent": intent, "intent_scores": router.distribution(state.user_message, intent)}
+
+
+async def afitness_node(state: GraphState) -> dict:
+    reply = await fitness.arespond(state.user, state.user_message, on_token=token_writer(), conversation=conversation(state))
+    return {"reply": reply}
+
+
+async def anutrition_node(state: GraphState) -> dict:
+    user_msg = state.user_message
+
+    emit(f"🍎 NUTRITION: Processing message")
+
+    if api_tool.needs_food_lookup(user_msg):
+        emit(f"🍎 NUTRITION: Requesting API food lookup")
+        return {"food_query": await api_tool.aextract_food_items(user_msg)}
+
+    emit(f"🍎 NUTRITION: Providing standard response")
+    reply = await nutrition.arespond(state.user, user_msg, on_token=token_writer(), conversation=conversation(state))
+    return {"reply": reply}
+
+
+async def adoctor_node(state: GraphState) -> dict:
+    reply = await doctor.arespond(state.user_message, state.user, on_token=token_writer(), conversation=conversation(state))
+    return {"reply": reply}
+
+
+async def atracking_node(state: GraphState) -> dict:
+    return {"reply": await asyncio.to_thread(tracking.summarize, state.user)}
+
+
+async def aapi_tool_node(state: GraphState) -> dict:
+    emit(f"🔍 API TOOL: Processing food lookup request")
+
+    if not state.food_query:
+        emit(f"❌ API TOOL: No food query found")
+        return {}
+
+    food_data = await api_tool.alookup_foods(state.food_query)
+    emit(f"🔍 API TOOL: Lookup complete, returning to nutrition agent")
+    return {"food_data": food_data}
+
+
+async def anutrition_with_data_node(state: GraphState) -> dict:
+    emit(f"🍎 NUTRITION: Generating response with API data")
+
+    if state.food_data:
+        reply = await nutrition.arespond_with_api_data(
+            state.user, state.user_message, state.food_data, on_token=token_writer(), conversation=conversation(state)
         )
-    
-    state.messages.append({"role": "assistant", "content": reply})
-    return state
+    else:
+        reply = await nutrition.arespond(
+            state.user, state.user_message, on_token=token_writer(), conversation=conversation(state)
+        )
+
+    return {"reply": reply}
+
+
+async def ageneral_node(state: GraphState) -> dict:
+    msg = state.user_message
+
+    # Check if this should be re-routed
+    analysis = reroute_target(state) or "out_of_domain"
+
+    if analysis in ["fitness", "nutrition", "health"]:
+        # Re-route to the correct agent
+        if analysis == "fitness":
+            reply = await fitness.arespond(state.user, msg, conversation=conversation(state))
+        elif analysis == "nutrition":
+            reply = await nutrition.arespond(state.user, msg, conversation=conversation(state))
+        elif analysis == "health":
+            reply = await doctor.arespond(msg, conversation=conversation(state))
+
+        # Add a note about the re-routing
+        reply = f"🔄 *[Re-routed to {analysis.title()}]*\n{reply}"
+    else:
+        # Handle out-of-domain queries
+        reply = OUT_OF_DOMAIN_REPLY
+
+    return {"reply": reply}
 
 
 # 🕸 Build the graph
 def build_graph():
     graph = StateGraph(GraphState)
 
-    # Add all nodes
-    graph.add_node("router", router_node)
-    graph.add_node("fitness", fitness_node)
-    graph.add_node("nutrition", nutrition_node)
-    graph.add_node("doctor", doctor_node)
-    graph.add_node("tracking", tracking_node)
-    graph.add_node("general", general_node)
-    graph.add_node("api_tool", api_tool_node)
-    graph.add_node("nutrition_with_data", nutrition_with_data_node)
+    # Add all nodes; each has a sync body for invoke() and an async one for
+    # ainvoke(), and both run inside a graph.<name> tracing span
+    def node(name, func, afunc):
+        traced = tracer.traced(f"graph.{name}")
+        return RunnableLambda(traced(func), afunc=traced(afunc), name=func.__name__)
+
+    graph.add_node("router", node("router", router_node, arouter_node))
+    graph.add_node("fitness", node("fitness", fitness_node, afitness_node))
+    graph.add_node("nutrition", node("nutrition", nutrition_node, anutrition_node))
+    graph.add_node("doctor", node("doctor", doctor_node, adoctor_node))
+    graph.add_node("tracking", node("tracking", tracking_node, atracking_node))
+    graph.add_node("general", node("general", general_node, ageneral_node))
+    graph.add_node("api_tool", node("api_tool", api_tool_node, aapi_tool_node))
+    graph.add_node("nutrition_with_data", node("nutrition_with_data", nutrition_with_data_node, anutrition_with_data_node))
 
     # Router dynamic routing
     def route(state: GraphState):
-        for msg in reversed(state.messages):
-            if msg.get("role") == "next_node":
-                return msg["content"]
-        return "tracking"
+        return state.intent or "tracking"
 
     # Router edges
     graph.add_conditional_edges(
@@ -253,9 +305,12 @@ def build_graph():
     )
 
     # 🔄 LOOP: Nutrition can go to API tool or end
+    def needs_lookup(state: GraphState):
+        return "api_tool" if state.food_query and not state.reply else "__end__"
+
     graph.add_conditional_edges(
         "nutrition",
-        get_next_node,
+        needs_lookup,
         {
             "api_tool": "api_tool",
             "__end__": "__end__"
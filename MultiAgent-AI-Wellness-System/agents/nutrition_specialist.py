@@ -1,14 +1,17 @@
 # Nutrition specialist agent
-from openai import OpenAI
-from app.config import settings
+import asyncio
+
+from tools.llm import UNAVAILABLE_REPLY, stream_text, astream_text
 from tools.db import Meal, get_session
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+LABEL = "🍎 *[Nutrition Coach]*\n"
+DATA_LABEL = "🍎 *[Nutrition Coach + Database]*\n"
 
 class NutritionAgent:
     """Logs meals and provides nutrition guidance."""
 
-    def respond(self, user: str, message: str) -> str:
+    def _prompt(self, user: str, message: str, conversation: str = "") -> str:
+        """Build the coaching prompt from the user's profile and RAG context"""
         # Get user profile for personalized advice
         from tools.db import get_session, UserProfile
         from sqlmodel import select
@@ -30,23 +33,21 @@ User Profile Context:
         
         # Retrieve relevant nutrition context
         from tools.rag import search
-        context_docs = "\n".join(search(f"nutrition {message}"))
+        context_docs = "\n".join(search(message, domain="nutrition"))
         
-        prompt = (
+        return (
             f"You are a nutrition coach. User says: '{message}'\n\n"
             f"{profile_context}\n"
+            f"{conversation}"
             f"Context: {context_docs}\n\n"
             f"Give a concise, helpful response (2-3 sentences max). "
             f"Consider their calorie goals and dietary restrictions. "
             f"Be specific and actionable."
         )
-        
-        reply = client.chat.completions.create(
-            model=settings.CHAT_MODEL,
-            messages=[{"role": "user", "content": prompt}]
-        ).choices[0].message.content
 
-        reply = f"🍎 *[Nutrition Coach]*\n{reply}"
+    def _finish(self, user: str, message: str, reply: str) -> str:
+        """Label the reply and log the meal"""
+        reply = f"{LABEL}{reply}"
 
         with get_session() as s:
             s.add(Meal(user=user, description=message.strip()))
@@ -54,9 +55,24 @@ User Profile Context:
 
         return reply
 
-    def respond_with_api_data(self, user: str, message: str, food_data: dict) -> str:
-        """Generate response using real API food data"""
-        
+    def respond(self, user: str, message: str, on_token=None, conversation: str = "") -> str:
+        """Reply to message; with on_token, the labelled reply is streamed to it as it's generated"""
+        prompt = self._prompt(user, message, conversation)
+        if on_token:
+            on_token(LABEL)
+        reply = stream_text("nutrition.respond", prompt, on_token, fallback=UNAVAILABLE_REPLY)
+        return self._finish(user, message, reply)
+
+    async def arespond(self, user: str, message: str, on_token=None, conversation: str = "") -> str:
+        # DB and retrieval are blocking; keep them off the event loop
+        prompt = await asyncio.to_thread(self._prompt, user, message, conversation)
+        if on_token:
+            on_token(LABEL)
+        reply = await astream_text("nutrition.respond", prompt, on_token, fallback=UNAVAILABLE_REPLY)
+        return await asyncio.to_thread(self._finish, user, message, reply)
+
+    def _api_data_prompt(self, user: str, message: str, food_data: dict, conversation: str = "") -> str:
+        """Build the prompt that grounds the answer in food database results"""
         # Get user profile for personalized advice
         from tools.db import get_session, UserProfile
         from sqlmodel import select
@@ -84,22 +100,27 @@ Food Database Results:
 - Fiber: {food_data.get('fiber_g', 0)}g
 - Source: {food_data.get('source', 'Database')}
 """
+        # Merged multi-item lookups keep each item's numbers as well
+        for item in food_data.get("items", []):
+            food_info += (
+                f"  - {item.get('food_name', 'Unknown')} ({item.get('serving_size', '1 serving')}): "
+                f"{item.get('calories_per_serving', 0)} kcal, {item.get('protein_g', 0)}g protein, "
+                f"{item.get('carbs_g', 0)}g carbs, {item.get('fat_g', 0)}g fat\n"
+            )
         
-        prompt = (
+        return (
             f"You are a nutrition coach. User asked: '{message}'\n\n"
             f"{profile_context}\n"
+            f"{conversation}"
             f"{food_info}\n\n"
             f"Provide a helpful response using this accurate food database information. "
             f"Give context about how this fits their goals and daily needs. "
             f"Be specific and actionable (2-3 sentences max)."
         )
-        
-        reply = client.chat.completions.create(
-            model=settings.CHAT_MODEL,
-            messages=[{"role": "user", "content": prompt}]
-        ).choices[0].message.content
 
-        reply = f"🍎 *[Nutrition Coach + Database]*\n{reply}"
+    def _finish_with_api_data(self, user: str, message: str, food_data: dict, reply: str) -> str:
+        """Label the reply and log the meal with the looked-up food name"""
+        reply = f"{DATA_LABEL}{reply}"
 
         # Log the meal with API data
         with get_session() as s:
@@ -108,3 +129,34 @@ Food Database Results:
 
         return reply
 
+    def _api_data_fallback(self, food_data: dict) -> str:
+        """The looked-up numbers on their own, for when the LLM is unavailable"""
+        return (
+            f"{food_data.get('food_name', 'This food')} ({food_data.get('serving_size', '1 serving')}): "
+            f"{food_data.get('calories_per_serving', 0)} kcal, {food_data.get('protein_g', 0)}g protein, "
+            f"{food_data.get('carbs_g', 0)}g carbs, {food_data.get('fat_g', 0)}g fat, "
+            f"{food_data.get('fiber_g', 0)}g fiber.\n\n{UNAVAILABLE_REPLY}"
+        )
+
+    def respond_with_api_data(self, user: str, message: str, food_data: dict, on_token=None,
+                              conversation: str = "") -> str:
+        """Generate response using real API food data"""
+        prompt = self._api_data_prompt(user, message, food_data, conversation)
+        if on_token:
+            on_token(DATA_LABEL)
+        reply = stream_text(
+            "nutrition.respond_with_api_data", prompt, on_token, fallback=self._api_data_fallback(food_data)
+        )
+        return self._finish_with_api_data(user, message, food_data, reply)
+
+    async def arespond_with_api_data(self, user: str, message: str, food_data: dict, on_token=None,
+                                     conversation: str = "") -> str:
+        """Async respond_with_api_data"""
+        prompt = await asyncio.to_thread(self._api_data_prompt, user, message, food_data, conversation)
+        if on_token:
+            on_token(DATA_LABEL)
+        reply = await astream_text(
+            "nutrition.respond_with_api_data", prompt, on_token, fallback=self._api_data_fallback(food_data)
+        )
+        return await asyncio.to_thread(self._finish_with_api_data, user, message, food_data, reply)
+
@@ -1,19 +1,19 @@
 # Agent router for directing user queries
 from typing import Literal
+from tools.events import emit
+from tools.intent_classifier import INTENTS, intent_classifier
+from tools.keyword_matcher import KeywordMatcher
+from agents.routing_keywords import ROUTING_KEYWORDS
+
+keyword_matcher = KeywordMatcher(ROUTING_KEYWORDS)
+# Keyword score that counts as full evidence for a domain in distribution()
+STRONG_KEYWORD_SCORE = 2.0
 
 class RouterAgent:
     """Classifies user input and routes it to the correct agent."""
 
-    def classify(self, text: str) -> Literal["fitness", "nutrition", "health", "misc"]:
-        from openai import OpenAI
-        from app.config import settings
-        
-        import streamlit as st
-        st.write(f"🔍 ROUTER: Classifying message: '{text}'")
-        
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        
-        classification_prompt = (
+    def _prompt(self, text: str) -> str:
+        return (
             f"Classify this user message into one of these categories:\n\n"
             f"User message: '{text}'\n\n"
             f"Categories:\n"
@@ -23,63 +23,105 @@ class RouterAgent:
             f"- MISC: Everything else not related to fitness, nutrition, or health\n\n"
             f"Respond with ONLY one word: fitness, nutrition, health, or misc"
         )
+
+    def _interpret(self, reply: str, text: str) -> Literal["fitness", "nutrition", "health", "misc"]:
+        classification = reply.strip().lower()
+        emit(f"✅ ROUTER: LLM classified as: '{classification}'")
+        
+        # Validate the response
+        if classification in ["fitness", "nutrition", "health", "misc"]:
+            emit(f"🎯 ROUTER: Final classification: '{classification}'")
+            if intent_classifier is not None:
+                intent_classifier.learn(text, classification)
+            return classification
+        else:
+            # Fallback to keyword matching if LLM gives unexpected response
+            emit(f"⚠️ ROUTER: Invalid LLM response '{classification}', falling back to keywords")
+            return self._fallback_classify(text)
+
+    def _on_error(self, e: Exception, text: str) -> Literal["fitness", "nutrition", "health", "misc"]:
+        # Fallback to keyword matching if API fails
+        emit(f"❌ ROUTER: LLM classification failed: {e}")
+        emit("🔄 ROUTER: Falling back to keyword matching")
+        return self._fallback_classify(text)
+
+    def _classify_locally(self, text: str):
+        """Intent from the local classifier when it is confident, else None"""
+        if intent_classifier is None:
+            return None
+        intent = intent_classifier.classify(text)
+        if intent is not None:
+            emit(f"⚡ ROUTER: Local classifier: '{intent}'")
+        return intent
+
+    def classify(self, text: str) -> Literal["fitness", "nutrition", "health", "misc"]:
+        from tools.llm import cached_chat_text
+        
+        emit(f"🔍 ROUTER: Classifying message: '{text}'")
+        
+        if (intent := self._classify_locally(text)) is not None:
+            return intent
         
         try:
-            st.write("🤖 ROUTER: Using LLM for classification...")
-            response = client.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[{"role": "user", "content": classification_prompt}],
+            emit("🤖 ROUTER: Using LLM for classification...")
+            reply = cached_chat_text(
+                "router.classify", "v1", text, self._prompt(text),
                 temperature=0.1  # Low temperature for consistent classification
             )
-            
-            classification = response.choices[0].message.content.strip().lower()
-            st.write(f"✅ ROUTER: LLM classified as: '{classification}'")
-            
-            # Validate the response
-            if classification in ["fitness", "nutrition", "health", "misc"]:
-                st.write(f"🎯 ROUTER: Final classification: '{classification}'")
-                return classification
-            else:
-                # Fallback to keyword matching if LLM gives unexpected response
-                st.write(f"⚠️ ROUTER: Invalid LLM response '{classification}', falling back to keywords")
-                return self._fallback_classify(text)
-                
+            return self._interpret(reply, text)
         except Exception as e:
-            # Fallback to keyword matching if API fails
-            st.write(f"❌ ROUTER: LLM classification failed: {e}")
-            st.write("🔄 ROUTER: Falling back to keyword matching")
-            return self._fallback_classify(text)
-    
-    def _fallback_classify(self, text: str) -> Literal["fitness", "nutrition", "health", "misc"]:
-        """Fallback keyword-based classification"""
-        import streamlit as st
-        st.write("🔤 ROUTER: Using keyword-based fallback classification")
-        import re
-        t = text.lower()
-        
-        def has_word(text, words):
-            for word in words:
-                if word in text or re.search(r'\b' + re.escape(word) + r'\b', text):
-                    return True
-            return False
+            return self._on_error(e, text)
+
+    async def aclassify(self, text: str) -> Literal["fitness", "nutrition", "health", "misc"]:
+        """Async classify"""
+        from tools.llm import acached_chat_text
         
-        fitness_keywords = ["workout", "working out", "exercise", "gym", "run", "running", "steps", "pushups", "training", "cardio", "strength", "muscle", "fitness", "active", "sport", "lift", "lifting"]
-        if has_word(t, fitness_keywords):
-            st.write("🏋️ ROUTER: Keyword match found for FITNESS")
-            return "fitness"
+        emit(f"🔍 ROUTER: Classifying message: '{text}'")
         
-        nutrition_keywords = ["meal", "eat", "eating", "breakfast", "lunch", "dinner", "snack", "calorie", "calories", "food", "hungry", "nutrition", "diet", "protein", "carbs", "fat"]
-        if has_word(t, nutrition_keywords):
-            st.write("🍎 ROUTER: Keyword match found for NUTRITION")
-            return "nutrition"
+        if (intent := self._classify_locally(text)) is not None:
+            return intent
         
-        health_keywords = ["symptom", "pain", "doctor", "health", "medicine", "sick", "illness", "anxious", "anxiety", "stress", "depression", "mental", "mood", "sleep", "tired", "fatigue", "headache", "ache", "aching", "hurt", "sore"]
-        if has_word(t, health_keywords):
-            st.write("🩺 ROUTER: Keyword match found for HEALTH")
-            return "health"
+        try:
+            emit("🤖 ROUTER: Using LLM for classification...")
+            reply = await acached_chat_text(
+                "router.classify", "v1", text, self._prompt(text),
+                temperature=0.1  # Low temperature for consistent classification
+            )
+            return self._interpret(reply, text)
+        except Exception as e:
+            return self._on_error(e, text)
+    
+    def _fallback_classify(self, text: str) -> Literal["fitness", "nutrition", "health", "misc"]:
+        """Fallback keyword-based classification: highest weighted keyword score wins"""
+        emit("🔤 ROUTER: Using keyword-based fallback classification")
         
-        st.write("🤖 ROUTER: No keyword matches, defaulting to MISC")
-        return "misc"
+        intent = keyword_matcher.best(text, default="misc")
+        if intent == "misc":
+            emit("🤖 ROUTER: No keyword matches, defaulting to MISC")
+        else:
+            emit(f"🔤 ROUTER: Keyword match found for {intent.upper()}")
+        return intent
+
+    def distribution(self, text: str, intent: str) -> dict:
+        """Scores over INTENTS summing to 1 for a routed message.
+
+        The routed intent, the keyword scores (capped at one strong keyword
+        per domain) and the local classifier's pick, when it is confident,
+        each add up to 1 of evidence. All of it is computed locally.
+        """
+        evidence = dict.fromkeys(INTENTS, 0.0)
+        evidence[intent] += 1.0
+        for domain, score in keyword_matcher.scores(text).items():
+            evidence[domain] += min(score / STRONG_KEYWORD_SCORE, 1.0)
+        if intent_classifier is not None:
+            prediction = intent_classifier.predict(text)
+            if prediction is not None and prediction[2]:
+                evidence[prediction[0]] += 1.0
+        total = sum(evidence.values())
+        return {k: round(v / total, 3) for k, v in evidence.items()}
 
     def route(self, text: str):
         return self.classify(text)
+
+    async def aroute(self, text: str):
+        return await self.aclassify(text)
@@ -0,0 +1,22 @@
+# Weighted keyword table for rule-based routing, importable without the router's intent classifier
+
+# Fallback routing keywords with weights: unambiguous terms count more than
+# words that often appear in other contexts ("run", "fat", "tired")
+ROUTING_KEYWORDS = {
+    "fitness": {
+        "workout": 2, "working out": 2, "exercise": 2, "gym": 2, "run": 1, "running": 1.5, "steps": 0.5,
+        "pushups": 2, "push-ups": 2, "squat": 2, "training": 1.5, "cardio": 2, "strength": 1, "muscle": 1.5,
+        "fitness": 2, "active": 0.5, "sport": 1, "lift": 1, "lifting": 1.5, "weights": 1.5,
+    },
+    "nutrition": {
+        "meal": 2, "eat": 1.5, "eating": 1.5, "breakfast": 2, "lunch": 2, "dinner": 2, "snack": 2,
+        "calorie": 2, "calories": 2, "food": 2, "hungry": 1.5, "nutrition": 2, "diet": 2, "protein": 1.5,
+        "carbs": 2, "fat": 1, "recipe": 2, "vitamin": 1,
+    },
+    "health": {
+        "symptom": 2, "pain": 1.5, "doctor": 2, "health": 1, "medicine": 2, "sick": 2, "illness": 2,
+        "anxious": 2, "anxiety": 2, "stress": 1.5, "depression": 2, "mental": 1.5, "mood": 1, "sleep": 1.5,
+        "tired": 1, "fatigue": 1.5, "headache": 2, "ache": 1.5, "aching": 1.5, "hurt": 1.5, "sore": 1,
+        "fever": 2, "injury": 1.5,
+    },
+}
@@ -1,20 +1,130 @@
+import asyncio
+import time
+
 from agents.graph import build_graph
+from tools.tracing import tracer
+from tools.events import emit
+from tools.memory import memory
 
 # Build and compile the graph once
 workflow = build_graph()
 
-def run_agent(user: str, msg: str) -> str:
+def _inputs(user: str, msg: str, history, stored=None) -> dict:
+    """Initial state; without an explicit history the user's stored conversation is loaded"""
+    summary = ""
+    if history is None and memory is not None:
+        summary, history = stored or memory.load(user)
+    return {"user": user, "user_message": msg, "history": list(history or []), "summary": summary}
+
+
+async def _ainputs(user: str, msg: str, history) -> dict:
+    """Async _inputs: the stored conversation is read in a worker thread"""
+    stored = None
+    if history is None and memory is not None:
+        stored = await asyncio.to_thread(memory.load, user)
+    return _inputs(user, msg, history, stored)
+
+
+def run_agent(user: str, msg: str, history=None) -> str:
     """
     Executes the LangGraph workflow for a given user and message.
+    history is the earlier turns as {"role", "content"} dicts, oldest first;
+    by default the user's stored conversation memory is used, and the
+    finished turn is added to it (the summary catches up in the background).
+    A caller passing its own history keeps that conversation out of memory.
     Returns the final agent response as plain text.
     """
-    import streamlit as st
-    st.write(f"🚀 WORKFLOW: Starting for user '{user}'")
+    emit(f"🚀 WORKFLOW: Starting for user '{user}'")
     
-    inputs = {"messages": [{"role": "user", "content": msg}], "user": user}
-    result = workflow.invoke(inputs)
+    with tracer.span("graph.run", user=user):
+        result = workflow.invoke(_inputs(user, msg, history))
+        final_response = result["reply"]
+        if history is None and memory is not None:
+            memory.remember(user, msg, final_response)
+    emit("✅ WORKFLOW: Completed")
     
-    final_response = result["messages"][-1]["content"]
-    st.write("✅ WORKFLOW: Completed")
+    return final_response
+
+
+async def arun_agent(user: str, msg: str, history=None) -> str:
+    """
+    Async run_agent: executes the workflow with non-blocking LLM calls so
+    one process can serve many conversations concurrently.
+    """
+    emit(f"🚀 WORKFLOW: Starting for user '{user}'")
+    
+    with tracer.span("graph.run", user=user):
+        result = await workflow.ainvoke(await _ainputs(user, msg, history))
+        final_response = result["reply"]
+        if history is None and memory is not None:
+            await memory.aremember(user, msg, final_response)
+    emit("✅ WORKFLOW: Completed")
     
     return final_response
+
+
+def _first_token(span, start: float):
+    ms = (time.perf_counter() - start) * 1000
+    span.set(ttft_ms=round(ms, 3))
+    tracer.observe("graph.ttft", ms)
+
+
+STREAM_CONFIG = {"configurable": {"stream_tokens": True}}
+
+
+def stream_agent(user: str, msg: str, history=None):
+    """
+    Streaming run_agent: yields the reply in text chunks as the answering
+    agent generates it. Nodes that don't stream (tracking, general) yield
+    their whole reply at the end. Time to first token is reported as the
+    graph.ttft metric.
+    """
+    emit(f"🚀 WORKFLOW: Starting for user '{user}'")
+    
+    inputs = _inputs(user, msg, history)
+    start = time.perf_counter()
+    streamed = False
+    final = {}
+    with tracer.span("graph.run", user=user, stream=True) as span:
+        for mode, chunk in workflow.stream(inputs, STREAM_CONFIG, stream_mode=["custom", "values"]):
+            if mode == "values":
+                final = chunk
+            elif "token" in chunk:
+                if not streamed:
+                    _first_token(span, start)
+                    streamed = True
+                yield chunk["token"]
+        if not streamed:
+            _first_token(span, start)
+            yield final.get("reply", "")
+        # A quick append; any summary update runs in the background
+        if history is None and memory is not None:
+            memory.remember(user, msg, final.get("reply", ""))
+    
+    emit("✅ WORKFLOW: Completed")
+
+
+async def astream_agent(user: str, msg: str, history=None):
+    """Async stream_agent, for serving many streaming conversations at once"""
+    emit(f"🚀 WORKFLOW: Starting for user '{user}'")
+    
+    inputs = await _ainputs(user, msg, history)
+    start = time.perf_counter()
+    streamed = False
+    final = {}
+    with tracer.span("graph.run", user=user, stream=True) as span:
+        async for mode, chunk in workflow.astream(inputs, STREAM_CONFIG, stream_mode=["custom", "values"]):
+            if mode == "values":
+                final = chunk
+            elif "token" in chunk:
+                if not streamed:
+                    _first_token(span, start)
+                    streamed = True
+                yield chunk["token"]
+        if not streamed:
+            _first_token(span, start)
+            yield final.get("reply", "")
+        if history is None and memory is not None:
+            await memory.aremember(user, msg, final.get("reply", ""))
+    
+    emit("✅ WORKFLOW: Completed")
@@ -1,8 +1,56 @@
 # API endpoints for AI Wellness
+import asyncio
+import json
+
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from tools.events import QueueSink, use_sink
 
 app = FastAPI()
 
+
+class ChatRequest(BaseModel):
+    user: str
+    message: str
+
+
 @app.get("/")
 def read_root():
-    return {"message": "AI Wellness API"}
\ No newline at end of file
+    return {"message": "AI Wellness API"}
+
+
+@app.post("/chat")
+async def chat(req: ChatRequest):
+    """Run one turn of the agent workflow and return the reply with its progress events"""
+    from agents.run_graph import arun_agent
+
+    sink = QueueSink()
+    with use_sink(sink):
+        reply = await arun_agent(req.user, req.message)
+    # Let events written from worker threads land on the queue
+    await asyncio.sleep(0)
+    events = []
+    while not sink.queue.empty():
+        events.append(sink.queue.get_nowait())
+    return {"reply": reply, "events": events}
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Run one turn of the agent workflow, streaming the reply as server-sent events.
+
+    Emits "token" events with text chunks as they are generated, then one
+    "done" event carrying the full reply.
+    """
+    from agents.run_graph import astream_agent
+
+    async def events():
+        parts = []
+        async for text in astream_agent(req.user, req.message):
+            parts.append(text)
+            yield f"event: token\ndata: {json.dumps({'text': text})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'reply': ''.join(parts)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
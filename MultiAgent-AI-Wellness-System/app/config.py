@@ -5,8 +5,90 @@ load_dotenv()
 
 class Settings:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    # Point at any OpenAI-compatible server, e.g. the local stand-in in benchmarks/llm_stub.py
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
     CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # "openai" or "hashing" (local, deterministic, no network; EMBEDDING_DIM wide)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+    EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
     DB_URL = os.getenv("DB_URL", "sqlite:///storage/app.db")
 
+    # Shared LLM client: connection pool, timeouts (seconds) and retries
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+    # Provider quotas, jittered exponential backoff (seconds) and circuit breaker
+    LLM_RPM = float(os.getenv("LLM_RPM", "500"))
+    LLM_TPM = float(os.getenv("LLM_TPM", "200000"))
+    LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))
+    LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "20"))
+    LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+    LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+    # Response cache for deterministic LLM calls, and prices used to report savings
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "storage/llm_cache.db")
+    LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "5000"))
+    LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 86400)))
+    LLM_PRICE_INPUT_PER_1M = float(os.getenv("LLM_PRICE_INPUT_PER_1M", "0.15"))
+    LLM_PRICE_OUTPUT_PER_1M = float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", "0.60"))
+
+    # Local intent classifier in front of the LLM router, learning from its labels
+    INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() == "true"
+    INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", "storage/intents.db")
+    INTENT_DIM = int(os.getenv("INTENT_DIM", "1024"))
+    INTENT_MIN_SIMILARITY = float(os.getenv("INTENT_MIN_SIMILARITY", "0.2"))
+    INTENT_MARGIN = float(os.getenv("INTENT_MARGIN", "0.08"))
+    INTENT_MIN_EXAMPLES = int(os.getenv("INTENT_MIN_EXAMPLES", "40"))
+    # Share of the router's intent scores a domain needs for a misc message to be re-routed to it
+    REROUTE_MIN_SCORE = float(os.getenv("REROUTE_MIN_SCORE", "0.3"))
+
+    # Earlier conversation messages carried in the graph state (user and assistant turns)
+    HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+    # Per-user conversation memory: recent turns within a token budget plus a rolling summary
+    MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "true").lower() == "true"
+    MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "600"))
+    MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "150"))
+
+    # Where agent/graph progress events go: none, logger or streamlit
+    EVENT_SINK = os.getenv("EVENT_SINK", "logger").lower()
+
+    # Tracing spans: exporter is none, jsonl (TRACE_PATH) or otlp (OTLP/HTTP collector)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+    TRACE_PATH = os.getenv("TRACE_PATH", "storage/traces.jsonl")
+    OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "http://localhost:4318")
+    TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "wellness-assistant")
+
+    # Embedding cache (in-memory LRU backed by a shared SQLite file)
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "storage/embedding_cache.db")
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+    # Index build: per-request embedding budget and concurrency
+    EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "512"))
+    EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+
+    # Open the FAISS index memory-mapped so worker processes share its pages
+    INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() == "true"
+
+    # ANN index type: flat, ivf, hnsw or ivfpq
+    INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").lower()
+    INDEX_TRAIN_SIZE = int(os.getenv("INDEX_TRAIN_SIZE", "20000"))
+    IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+    PQ_M = int(os.getenv("PQ_M", "64"))
+    HNSW_M = int(os.getenv("HNSW_M", "32"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+    # Retrieval mode: vector, lexical or hybrid (BM25 first, embed only when unsure)
+    SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid").lower()
+    LEXICAL_CONFIDENCE = float(os.getenv("LEXICAL_CONFIDENCE", "0.6"))
+
 settings = Settings()
@@ -3,13 +3,18 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
 import pandas as pd
-from agents.run_graph import run_agent
+from agents.run_graph import stream_agent
 from tools.db import get_session, Meal, Workout, DailyNutrition, WorkoutSession, UserProfile, init_db
+from tools.events import StreamlitSink, set_default_sink
+from tools.memory import memory, recent_messages
 from sqlmodel import select
 
 # Initialize database on startup
 init_db()
 
+# Show agent progress breadcrumbs in the page
+set_default_sink(StreamlitSink())
+
 st.set_page_config(page_title="AI Wellness Assistant", page_icon="💪", layout="wide")
 
 # Custom CSS for better chat appearance
@@ -56,10 +61,14 @@ if page == "Chat":
     with col2:
         if st.button("🗑️ Clear Chat"):
             st.session_state.chat = []
+            if memory is not None:
+                memory.clear(user)
             st.rerun()
 
     if "chat" not in st.session_state:
-        st.session_state.chat = []
+        # Pick up where the stored conversation memory left off
+        recent = memory.load(user)[1] if memory is not None else []
+        st.session_state.chat = [("You" if m["role"] == "user" else "AI", m["content"]) for m in recent]
 
     # Display chat messages with proper formatting
     for who, txt in st.session_state.chat:
@@ -77,17 +86,15 @@ if page == "Chat":
         with st.chat_message("user"):
             st.write(msg)
         
-        # Get AI response
-        with st.spinner("Thinking..."):
-            ans = run_agent(user, msg)
-        
-        # Add AI response
+        # Stream the AI response as it is generated
         with st.chat_message("assistant"):
-            st.write(ans)
+            ans = st.write_stream(stream_agent(user, msg))
         
         # Store in session state
         st.session_state.chat.append(("You", msg))
         st.session_state.chat.append(("AI", ans))
+        # Only the recent window stays on the page; older turns live on in the memory summary
+        st.session_state.chat = recent_messages(st.session_state.chat)
         
         # Rerun to update the display
         st.rerun()
@@ -0,0 +1,88 @@
+# Recall / latency / memory benchmark for the RAG index types
+#
+#   python -m benchmarks.ann_benchmark --n 1000000 --d 256
+#
+# Vectors are a synthetic clustered corpus (no API calls). Recall@k is
+# measured against exact search with the flat index.
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from tools.index_factory import INDEX_TYPES, make_index, needs_training, tune
+
+
+def synthetic_corpus(n: int, d: int, clusters: int, seed: int) -> np.ndarray:
+    """Gaussian clusters on the unit sphere, roughly like text embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, d)).astype("float32")
+    out = np.empty((n, d), dtype="float32")
+    step = 100_000
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        labels = rng.integers(0, clusters, stop - start)
+        out[start:stop] = centers[labels] + 0.6 * rng.standard_normal((stop - start, d)).astype("float32")
+    faiss.normalize_L2(out)
+    return out
+
+
+def measure(index, queries: np.ndarray, k: int):
+    """Return (ids, per-query latencies in ms) for one-at-a-time search"""
+    ids = np.empty((len(queries), k), dtype="int64")
+    lat = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, I = index.search(q[None, :], k)
+        lat[i] = (time.perf_counter() - start) * 1000
+        ids[i] = I[0]
+    return ids, lat
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare RAG index types on a synthetic corpus")
+    parser.add_argument("--n", type=int, default=1_000_000, help="corpus size")
+    parser.add_argument("--d", type=int, default=256, help="vector dimension")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--train", type=int, default=100_000, help="training sample for IVF types")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Generating {args.n:,} x {args.d} synthetic vectors...")
+    xb = synthetic_corpus(args.n, args.d, clusters=max(16, args.n // 1000), seed=args.seed)
+    xq = synthetic_corpus(args.queries, args.d, clusters=max(16, args.n // 1000), seed=args.seed)
+    ids = np.arange(args.n, dtype="int64")
+
+    truth = None
+    rows = []
+    # Flat always runs first: it is the recall baseline
+    kinds = ["flat"] + [t for t in args.types.split(",") if t != "flat"]
+    for kind in kinds:
+        start = time.perf_counter()
+        train = xb[np.random.default_rng(args.seed).choice(args.n, min(args.train, args.n), replace=False)] if needs_training(kind) else None
+        index = make_index(kind, args.d, train)
+        index.add_with_ids(xb, ids)
+        tune(index)
+        build_s = time.perf_counter() - start
+
+        found, lat = measure(index, xq, args.k)
+        if truth is None:
+            truth = found
+        mem_mb = faiss.serialize_index(index).nbytes / 1e6
+        rows.append((kind, recall_at_k(found, truth), np.percentile(lat, 50), np.percentile(lat, 99), mem_mb, build_s))
+        del index
+
+    print(f"\n{'type':<8}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p99 ms':>10}{'mem MB':>10}{'build s':>10}")
+    for kind, rec, p50, p99, mem, build in rows:
+        print(f"{kind:<8}{rec:>10.3f}{p50:>10.3f}{p99:>10.3f}{mem:>10.1f}{build:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Throughput of the LangGraph workflow: sequential run_agent vs concurrent arun_agent
+#
+#   python -m benchmarks.graph_throughput --conversations 200 --concurrency 100
+#
+# Runs against whatever LLM endpoint app/config.py points at, so every
+# conversation makes real (billable) calls unless that is a local stand-in.
+# For repeatable offline numbers, start benchmarks/llm_stub.py and set
+# OPENAI_BASE_URL=http://127.0.0.1:8100/v1.
+import argparse
+import asyncio
+import time
+
+from agents.run_graph import arun_agent, run_agent
+
+MESSAGES = [
+    "I want to start working out",
+    "What's a healthy breakfast?",
+    "I've been feeling anxious lately",
+    "How many calories in a banana?",
+    "What's the weather like?",
+]
+
+
+def run_sync(n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        run_agent(f"bench-{i}", MESSAGES[i % len(MESSAGES)])
+    return time.perf_counter() - start
+
+
+async def run_async(n: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await arun_agent(f"bench-{i}", MESSAGES[i % len(MESSAGES)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync and async workflow throughput")
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--sync-conversations", type=int, default=20,
+                        help="sequential runs are slow, so sample fewer of them")
+    args = parser.parse_args()
+
+    sync_s = run_sync(args.sync_conversations)
+    async_s = asyncio.run(run_async(args.conversations, args.concurrency))
+    sync_tput = args.sync_conversations / sync_s
+    async_tput = args.conversations / async_s
+    print(f"sync : {args.sync_conversations} conversations in {sync_s:.2f}s -> {sync_tput:.1f}/s")
+    print(f"async: {args.conversations} conversations in {async_s:.2f}s "
+          f"(concurrency {args.concurrency}) -> {async_tput:.1f}/s")
+    print(f"speedup: {async_tput / sync_tput:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
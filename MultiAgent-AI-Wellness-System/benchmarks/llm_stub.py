@@ -0,0 +1,221 @@
+# Local OpenAI-compatible stand-in for load testing without the real API
+#
+#   python -m benchmarks.llm_stub --port 8100 --latency-ms 400 --tokens-per-sec 60 --error-rate 0.01
+#   OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=stub python -m benchmarks.graph_throughput
+#
+# Serves /v1/chat/completions (plain and streamed) and /v1/embeddings with
+# lognormal latency, a fixed token rate, injected 500/429 errors and canned
+# answers for the prompts the agents parse (routing, food lookup and
+# extraction, nutrition calculator, body age). Given a seed, runs are repeatable.
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from agents.routing_keywords import ROUTING_KEYWORDS
+from tools.keyword_matcher import KeywordMatcher
+
+EMBEDDING_DIMS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+
+FOODS = {
+    "banana": ("1 medium banana", 105, 1.3, 27, 0.4, 3.1),
+    "apple": ("1 medium apple", 95, 0.5, 25, 0.3, 4.4),
+    "egg": ("1 large egg", 72, 6.3, 0.4, 4.8, 0),
+    "pizza": ("1 slice", 285, 12, 36, 10, 2.5),
+    "rice": ("1 cup cooked", 205, 4.3, 45, 0.4, 0.6),
+    "chicken": ("6 oz breast", 280, 53, 0, 6, 0),
+    "oatmeal": ("1 cup cooked", 150, 5, 27, 3, 4),
+}
+DEFAULT_FOOD = ("1 serving", 200, 8, 25, 7, 2)
+
+# Routes like the router's keyword fallback, without its classifier and storage
+keyword_matcher = KeywordMatcher(ROUTING_KEYWORDS)
+
+COACH_WORDS = (
+    "Start with three short sessions a week and build up gradually. Focus on good form, "
+    "stay hydrated, get enough sleep and pair your training with balanced meals rich in "
+    "protein, vegetables and whole grains. Track how you feel and adjust the plan as you go."
+).split()
+
+
+class StubConfig:
+    def __init__(self, latency_ms=300.0, latency_sigma=0.5, tokens_per_sec=80.0, error_rate=0.0,
+                 rate_limit_rate=0.0, reply_words=50, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.reply_words = reply_words
+        self.rng = random.Random(seed)
+
+    def latency(self) -> float:
+        """Seconds before the first token: lognormal around latency_ms"""
+        return self.latency_ms / 1000 * math.exp(self.rng.gauss(0, self.latency_sigma))
+
+
+def count_tokens(text: str) -> int:
+    return max(1, round(len(text.split()) * 1.3))
+
+
+def _quoted(prompt: str, after: str) -> str:
+    # Each prompt closes the quote at the end of its line, so apostrophes
+    # inside the message ("I've", "What's") don't end it early
+    m = re.search(re.escape(after) + r"\s*(['\"])(.*)\1[ \t]*$", prompt, re.M)
+    return m.group(2) if m else ""
+
+
+def _food(query: str):
+    q = query.lower()
+    for name, values in FOODS.items():
+        if name in q:
+            return name, values
+    return query.strip() or "food", DEFAULT_FOOD
+
+
+def canned_reply(prompt: str, cfg: StubConfig) -> str:
+    """What the real model would plausibly say, in the shape each caller parses"""
+    if "Classify this user message" in prompt:
+        return keyword_matcher.best(_quoted(prompt, "User message:"), default="misc")
+    if "You are a food database API" in prompt:
+        name, (serving, kcal, protein, carbs, fat, fiber) = _food(_quoted(prompt, "nutrition data for:"))
+        return json.dumps({
+            "food_name": name, "serving_size": serving, "calories_per_serving": kcal, "protein_g": protein,
+            "carbs_g": carbs, "fat_g": fat, "fiber_g": fiber, "source": "USDA Food Database",
+        })
+    if "Extract the food items" in prompt:
+        message = _quoted(prompt, "database lookup:")
+        items = [item.strip() for item in re.split(r"[,;+]", message) if item.strip()]
+        return json.dumps({"items": items or [message]})
+    if "Calculate the approximate nutrition values" in prompt:
+        items = re.search(r"Food items:\s*(.*)", prompt)
+        breakdown = []
+        for item in (items.group(1) if items else "").split(","):
+            name, (_, kcal, protein, carbs, fat, fiber) = _food(item)
+            breakdown.append({"item": name, "calories": kcal, "protein": protein, "carbs": carbs, "fat": fat,
+                              "fiber": fiber})
+        total = lambda k: round(sum(b[k] for b in breakdown), 1)
+        return json.dumps({
+            "total_calories": total("calories"), "protein_g": total("protein"), "carbs_g": total("carbs"),
+            "fat_g": total("fat"), "fiber_g": total("fiber"),
+            "breakdown": [{k: v for k, v in b.items() if k != "fiber"} for b in breakdown],
+        })
+    if "biological/body age" in prompt:
+        age = re.search(r"Age:\s*(\d+)", prompt)
+        age = int(age.group(1)) if age else 35
+        return json.dumps({
+            "body_age": age + 2, "age_difference": 2, "health_score": 72,
+            "key_factors": ["Activity level", "Sleep", "Stress"],
+            "recommendations": ["Walk 30 minutes daily", "Sleep 7-9 hours", "Practice stress management"],
+        })
+    words = [COACH_WORDS[i % len(COACH_WORDS)] for i in range(cfg.reply_words)]
+    return " ".join(words)
+
+
+def _error(cfg: StubConfig):
+    r = cfg.rng.random()
+    if r < cfg.error_rate:
+        return JSONResponse({"error": {"message": "Injected server error", "type": "server_error"}}, status_code=500)
+    if r < cfg.error_rate + cfg.rate_limit_rate:
+        return JSONResponse(
+            {"error": {"message": "Injected rate limit", "type": "rate_limit_exceeded"}},
+            status_code=429, headers={"retry-after": "1"},
+        )
+    return None
+
+
+def create_app(cfg: StubConfig) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if (error := _error(cfg)) is not None:
+            return error
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        text = canned_reply(prompt, cfg)
+        model = body.get("model", "stub")
+        usage = {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        cid, created = f"chatcmpl-{uuid.uuid4().hex[:24]}", int(time.time())
+        await asyncio.sleep(cfg.latency())
+
+        if not body.get("stream"):
+            await asyncio.sleep(usage["completion_tokens"] / cfg.tokens_per_sec)
+            return {
+                "id": cid, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        def chunk(delta, finish=None, **extra):
+            choices = [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish}]
+            data = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": choices, **extra}
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            pieces = re.findall(r"\S+\s*", text) or [text]
+            for piece in pieces:
+                await asyncio.sleep(count_tokens(piece) / cfg.tokens_per_sec)
+                yield chunk({"content": piece})
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        from tools.embeddings import HashingEmbeddings
+
+        body = await request.json()
+        if (error := _error(cfg)) is not None:
+            return error
+        texts = body.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        model = body.get("model", "text-embedding-3-small")
+        dim = body.get("dimensions") or EMBEDDING_DIMS.get(model, 1536)
+        await asyncio.sleep(cfg.latency())
+        vecs = HashingEmbeddings(dim).embed(texts)
+        tokens = sum(count_tokens(t) for t in texts)
+        return {
+            "object": "list", "model": model,
+            "data": [{"object": "embedding", "index": i, "embedding": v.tolist()} for i, v in enumerate(vecs)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal spread of the latency")
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests failing with 429")
+    parser.add_argument("--reply-words", type=int, default=50, help="length of free-form replies")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    cfg = StubConfig(args.latency_ms, args.latency_sigma, args.tokens_per_sec, args.error_rate,
+                     args.rate_limit_rate, args.reply_words, args.seed)
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Per-turn latency and LLM calls for messages the router sends to the general node
+#
+#   LLM_CACHE_ENABLED=false python -m benchmarks.misc_routing --turns 50
+#
+# Every message is one the router classifies as misc. Run it against
+# benchmarks/llm_stub.py (OPENAI_BASE_URL) for repeatable numbers, with the
+# response cache off so every turn pays for its calls.
+import argparse
+import time
+
+from agents.run_graph import run_agent
+from tools.llm import call_stats
+from tools.tracing import percentile
+
+MESSAGES = [
+    "What's the weather like?",
+    "Tell me a joke",
+    "Who won the football game last night?",
+    "Can you help me with my taxes?",
+    "How do I plan my week?",
+    "Recommend a good book",
+    "What's the capital of Australia?",
+    "How do I reset my router?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of misc-routed turns")
+    parser.add_argument("--turns", type=int, default=40)
+    args = parser.parse_args()
+
+    durations = []
+    for i in range(args.turns):
+        start = time.perf_counter()
+        run_agent(f"misc-bench-{i}", MESSAGES[i % len(MESSAGES)])
+        durations.append((time.perf_counter() - start) * 1000)
+
+    durations.sort()
+    calls = sum(s["calls"] for s in call_stats.summary().values())
+    print(f"{args.turns} turns: p50 {percentile(durations, 50):.0f} ms, p95 {percentile(durations, 95):.0f} ms, "
+          f"{calls / args.turns:.2f} LLM calls/turn")
+    for site, s in sorted(call_stats.summary().items()):
+        print(f"  {site:<28} {s['calls']:5d} calls  avg {s['avg_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# SQLite-backed store for RAG chunk text, metadata and a BM25 inverted index
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from how i in is it me my of on or "
+    "should so that the this to was what when which with you your".split()
+)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+class ChunkStore:
+    """Chunk text and metadata keyed by FAISS id.
+
+    Search only reads the rows for its top-k ids, so nothing is parsed up
+    front and processes on one host share the file through the page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        # (generation, {file: chunk ids}, {files: allowed ids}) for the last corpus seen
+        self._files_cache = None
+        conn = self.conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY, file TEXT NOT NULL, chunk INTEGER NOT NULL, text TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_file ON chunks(file)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "name TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, id INTEGER NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, id))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS postings_id ON postings(id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS doc_lengths (id INTEGER PRIMARY KEY, len INTEGER NOT NULL)")
+        # Build settings the vectors depend on, e.g. the embedding model
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def conn(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, ids) -> dict:
+        """Return {id: {"text", "file", "chunk"}} for the ids that exist"""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+        marks = ",".join("?" * len(ids))
+        rows = self.conn().execute(
+            f"SELECT id, file, chunk, text FROM chunks WHERE id IN ({marks})", ids
+        ).fetchall()
+        return {r[0]: {"file": r[1], "chunk": r[2], "text": r[3]} for r in rows}
+
+    @staticmethod
+    def add_chunk(conn, cid: int, file: str, chunk: int, text: str):
+        """Insert a chunk row and its postings inside an open transaction"""
+        conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", (cid, file, chunk, text))
+        terms = Counter(tokenize(text))
+        conn.execute("DELETE FROM postings WHERE id = ?", (cid,))
+        conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", [(t, cid, tf) for t, tf in terms.items()])
+        conn.execute("INSERT OR REPLACE INTO doc_lengths VALUES (?, ?)", (cid, sum(terms.values())))
+
+    @staticmethod
+    def delete_file(conn, file: str):
+        """Drop a file's chunks and their postings inside an open transaction"""
+        ids = "SELECT id FROM chunks WHERE file = ?"
+        conn.execute(f"DELETE FROM postings WHERE id IN ({ids})", (file,))
+        conn.execute(f"DELETE FROM doc_lengths WHERE id IN ({ids})", (file,))
+        conn.execute("DELETE FROM chunks WHERE file = ?", (file,))
+
+    @staticmethod
+    def refresh_stats(conn):
+        """Record the corpus size and total length BM25 needs, inside the writing transaction.
+
+        Also bumps the generation, which tells readers in every process that
+        their cached file -> ids maps are stale.
+        """
+        n, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(len), 0) FROM doc_lengths").fetchone()
+        ChunkStore.set_meta(conn, "doc_count", n)
+        ChunkStore.set_meta(conn, "total_len", total)
+        ChunkStore.bump_generation(conn)
+
+    @staticmethod
+    def bump_generation(conn):
+        generation = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        ChunkStore.set_meta(conn, "generation", int(generation[0]) + 1 if generation else 1)
+
+    def _stats(self) -> dict:
+        stats = dict(self.conn().execute(
+            "SELECT key, value FROM meta WHERE key IN ('doc_count', 'total_len', 'generation')"
+        ))
+        if len(stats) < 3:
+            # Store written before the stats rows existed: count once and keep them
+            with self.transaction() as conn:
+                self.refresh_stats(conn)
+            return self._stats()
+        return {key: int(value) for key, value in stats.items()}
+
+    def generation(self) -> int:
+        return self._stats()["generation"]
+
+    def corpus_stats(self) -> tuple:
+        """(number of chunks, average length) from the meta rows the writers keep current"""
+        stats = self._stats()
+        n = stats["doc_count"]
+        return n, stats["total_len"] / n if n else 0.0
+
+    def _files(self, generation: int) -> tuple:
+        """({file: chunk ids}, {files: allowed ids}) for generation, read once per generation"""
+        cached = self._files_cache
+        if cached is None or cached[0] != generation:
+            file_ids = {}
+            for cid, file in self.conn().execute("SELECT id, file FROM chunks"):
+                file_ids.setdefault(file, set()).add(cid)
+            cached = self._files_cache = (generation, file_ids, {})
+        return cached[1], cached[2]
+
+    def _allowed_ids(self, files: list, generation: int) -> frozenset:
+        file_ids, allowed = self._files(generation)
+        key = frozenset(files)
+        if key not in allowed:
+            allowed[key] = frozenset().union(*(file_ids.get(f, ()) for f in key))
+        return allowed[key]
+
+    @staticmethod
+    def clear(conn):
+        for table in ("chunks", "files", "postings", "doc_lengths"):
+            conn.execute(f"DELETE FROM {table}")
+
+    def lexical_search(self, query: str, k: int = 3, files: list | None = None) -> tuple:
+        """BM25 over the stored chunks, optionally only those from files.
+
+        Returns ([(id, score), ...], confidence) where confidence is the top
+        score as a fraction of the best score the query's terms could reach.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return [], 0.0
+        conn = self.conn()
+        stats = self._stats()
+        n = stats["doc_count"]
+        if not n:
+            return [], 0.0
+        avgdl = stats["total_len"] / n
+        allowed = self._allowed_ids(files, stats["generation"]) if files else None
+        sql = "SELECT p.id, p.tf, d.len FROM postings p JOIN doc_lengths d ON d.id = p.id WHERE p.term = ?"
+        scores, max_score = Counter(), 0.0
+        for term in terms:
+            rows = conn.execute(sql, (term,)).fetchall()
+            # idf stays corpus-wide so scores are comparable across domains
+            df = len(rows)
+            if allowed is not None:
+                rows = [r for r in rows if r[0] in allowed]
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            max_score += idf * (BM25_K1 + 1)
+            for cid, tf, dl in rows:
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl)
+                scores[cid] += idf * tf * (BM25_K1 + 1) / norm
+        top = scores.most_common(k)
+        confidence = top[0][1] / max_score if top and max_score else 0.0
+        return top, confidence
+
+    def ensure_postings(self):
+        """Backfill the inverted index for stores written before it existed"""
+        conn = self.conn()
+        if self.is_empty() or conn.execute("SELECT 1 FROM doc_lengths LIMIT 1").fetchone():
+            return
+        rows = conn.execute("SELECT id, file, chunk, text FROM chunks").fetchall()
+        with self.transaction() as conn:
+            for row in rows:
+                self.add_chunk(conn, *row)
+            self.refresh_stats(conn)
+
+    def get_meta(self, key: str):
+        row = self.conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def set_meta(conn, key: str, value):
+        conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def file_signatures(self) -> dict:
+        return {
+            name: (size, mtime_ns)
+            for name, size, mtime_ns in self.conn().execute("SELECT name, size, mtime_ns FROM files")
+        }
+
+    def id_files(self) -> dict:
+        return dict(self.conn().execute("SELECT id, file FROM chunks"))
+
+    def file_names(self, generation: int | None = None) -> list:
+        """Files with chunks, from the per-generation cache"""
+        file_ids, _ = self._files(self.generation() if generation is None else generation)
+        return list(file_ids)
+
+    def is_empty(self) -> bool:
+        return self.conn().execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None
+
+    def migrate_json(self, meta_path: str):
+        """One-time import of the original positional meta.json layout"""
+        if not os.path.exists(meta_path) or not self.is_empty():
+            return
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        rows = [
+            (i, m.get("file", ""), m.get("chunk", i), doc)
+            for i, (doc, m) in enumerate(zip(meta.get("docs", []), meta.get("metas", [])))
+        ]
+        with self.transaction() as conn:
+            for row in rows:
+                self.add_chunk(conn, *row)
+            self.refresh_stats(conn)
+
+    def transaction(self):
+        return _Transaction(self.conn())
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -1,10 +1,34 @@
 # Database utilities
+from sqlalchemy import event
 from sqlmodel import SQLModel, Field, create_engine, Session
 from datetime import datetime, timezone
 from app.config import settings
+from tools.tracing import current_span, tracer
 
 engine = create_engine(settings.DB_URL, echo=False)
 
+
+@event.listens_for(engine, "after_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    span = current_span()
+    if span is not None and span.name == "db.session":
+        span.attrs["statements"] = span.attrs.get("statements", 0) + 1
+
+
+class TracedSession(Session):
+    """Session that records a db.session span while used as a context manager"""
+
+    def __enter__(self):
+        self._span = tracer.span("db.session")
+        self._span.__enter__()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return super().__exit__(exc_type, exc, tb)
+        finally:
+            self._span.__exit__(exc_type, exc, tb)
+
 class Meal(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     user: str
@@ -81,8 +105,16 @@ class UserProfile(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class Conversation(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    user: str = Field(unique=True)
+    summary: str = ""  # rolling summary of turns that left the window
+    turns: str = "[]"  # JSON list of recent {"role", "content"} messages, oldest first
+    summarized: int = 0  # messages folded into the summary so far
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 def init_db():
     SQLModel.metadata.create_all(engine)
 
 def get_session():
-    return Session(engine)
+    return TracedSession(engine)
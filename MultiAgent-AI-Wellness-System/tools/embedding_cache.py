@@ -0,0 +1,104 @@
+# Two-tier embedding cache: in-process LRU in front of a shared SQLite store
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """Caches embedding vectors keyed on (model, normalized text).
+
+    Lookups hit the in-memory LRU first, then the SQLite file. The SQLite
+    store runs in WAL mode so several worker processes can share it.
+    """
+
+    def __init__(self, path: str, max_items: int = 10000):
+        self.path = path
+        self.max_items = max_items
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vec BLOB NOT NULL)"
+        )
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vec):
+        with self._lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+
+    def get_many(self, model: str, texts: list) -> list:
+        """Return a list aligned with texts holding cached vectors or None"""
+        keys = [self.key(model, t) for t in texts]
+        found = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, k in enumerate(keys):
+                vec = self._lru.get(k)
+                if vec is not None:
+                    self._lru.move_to_end(k)
+                    found[i] = vec
+                    self.stats["memory_hits"] += 1
+                else:
+                    missing.setdefault(k, []).append(i)
+
+        if missing:
+            wanted = list(missing)
+            rows = []
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows += self._conn().execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+            for k, blob in rows:
+                vec = np.frombuffer(blob, dtype="float32")
+                self._remember(k, vec)
+                for i in missing.pop(k):
+                    found[i] = vec
+                    self.stats["disk_hits"] += 1
+            self.stats["misses"] += sum(len(v) for v in missing.values())
+        return found
+
+    def put_many(self, model: str, texts: list, vecs: np.ndarray):
+        rows = []
+        for text, vec in zip(texts, vecs):
+            vec = np.ascontiguousarray(vec, dtype="float32")
+            k = self.key(model, text)
+            self._remember(k, vec)
+            rows.append((k, vec.shape[0], vec.tobytes()))
+        self._conn().executemany(
+            "INSERT OR REPLACE INTO embeddings (key, dim, vec) VALUES (?, ?, ?)", rows
+        )
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
@@ -0,0 +1,82 @@
+# Embedding backends for the RAG system
+import zlib
+
+import numpy as np
+
+from app.config import settings
+from tools.chunk_store import tokenize
+
+
+class OpenAIEmbeddings:
+    """Remote embeddings from the OpenAI API"""
+
+    cacheable = True
+
+    # Only known once the first vectors come back
+    dim = None
+
+    def __init__(self, model: str):
+        self.model_name = model
+
+    def embed(self, texts: list) -> np.ndarray:
+        from tools.llm import embed
+        r = embed("rag.embed", texts, model=self.model_name)
+        return np.array([d.embedding for d in r.data]).astype("float32")
+
+
+class HashingEmbeddings:
+    """Local, deterministic embeddings with no network access.
+
+    Word unigrams, word bigrams and character trigrams are hashed (crc32,
+    so vectors are identical across processes and runs) straight into a
+    signed dim-sized vector with sublinear term frequency weighting, then
+    L2-normalized. The whole batch is scattered with one np.add.at call.
+    """
+
+    cacheable = False
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.model_name = f"hashing-{dim}"
+
+    @staticmethod
+    def features(text: str) -> dict:
+        words = tokenize(text)
+        feats = {}
+        for w in words:
+            feats[w] = feats.get(w, 0) + 1
+            padded = f" {w} "
+            for i in range(len(padded) - 2):
+                g = "#" + padded[i:i + 3]
+                feats[g] = feats.get(g, 0) + 1
+        for a, b in zip(words, words[1:]):
+            g = a + " " + b
+            feats[g] = feats.get(g, 0) + 1
+        return feats
+
+    def embed(self, texts: list) -> np.ndarray:
+        rows, hashes, counts = [], [], []
+        for r, text in enumerate(texts):
+            for feat, tf in self.features(text).items():
+                rows.append(r)
+                hashes.append(zlib.crc32(feat.encode("utf-8")))
+                counts.append(tf)
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        if hashes:
+            h = np.array(hashes, dtype="uint32")
+            cols = (h % self.dim).astype("int64")
+            # The top hash bit picks the sign so collisions tend to cancel out
+            signs = np.where(h >> 31, -1.0, 1.0).astype("float32")
+            weights = (1.0 + np.log(np.array(counts, dtype="float32"))) * signs
+            np.add.at(out, (np.array(rows, dtype="int64"), cols), weights)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+def get_backend():
+    """Embedding backend selected by EMBEDDING_BACKEND"""
+    if settings.EMBEDDING_BACKEND == "hashing":
+        return HashingEmbeddings(settings.EMBEDDING_DIM)
+    if settings.EMBEDDING_BACKEND == "openai":
+        return OpenAIEmbeddings(settings.EMBEDDING_MODEL)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{settings.EMBEDDING_BACKEND}'")
@@ -0,0 +1,87 @@
+# Progress events from agents and the graph, routed to a pluggable sink
+import asyncio
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from app.config import settings
+
+
+class NullSink:
+    """Drops every event"""
+
+    def write(self, message: str):
+        pass
+
+
+class LoggerSink:
+    """Logs events at INFO on the wellness.events logger"""
+
+    def __init__(self, logger: logging.Logger | None = None):
+        self.logger = logger or logging.getLogger("wellness.events")
+
+    def write(self, message: str):
+        self.logger.info(message)
+
+
+class StreamlitSink:
+    """Renders events with st.write, as the chat page always has"""
+
+    def __init__(self):
+        import streamlit as st
+        self._st = st
+
+    def write(self, message: str):
+        self._st.write(message)
+
+
+class QueueSink:
+    """Puts events on an asyncio.Queue, e.g. for an API response stream.
+
+    Safe to write from worker threads; items are delivered on the queue's loop.
+    """
+
+    def __init__(self, queue: asyncio.Queue | None = None, loop: asyncio.AbstractEventLoop | None = None):
+        self.queue = queue or asyncio.Queue()
+        self.loop = loop or asyncio.get_running_loop()
+
+    def write(self, message: str):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+
+
+SINKS = {"none": NullSink, "logger": LoggerSink, "streamlit": StreamlitSink}
+
+
+def make_sink(kind: str):
+    if kind not in SINKS:
+        raise ValueError(f"Unknown EVENT_SINK '{kind}', expected one of {tuple(SINKS)}")
+    return SINKS[kind]()
+
+
+# Process-wide default, plus a per-context override so concurrent requests
+# can each collect their own events
+_default_sink = make_sink(settings.EVENT_SINK)
+_sink = contextvars.ContextVar("event_sink", default=None)
+
+
+def set_default_sink(sink):
+    global _default_sink
+    _default_sink = sink
+
+
+def get_sink():
+    return _sink.get() or _default_sink
+
+
+@contextmanager
+def use_sink(sink):
+    """Send events emitted inside the block (and tasks/threads it starts) to sink"""
+    token = _sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _sink.reset(token)
+
+
+def emit(message: str):
+    get_sink().write(message)
@@ -0,0 +1,76 @@
+# FAISS index construction for the configurable RAG index types
+import math
+
+import faiss
+import numpy as np
+
+from app.config import settings
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+
+def needs_training(kind: str) -> bool:
+    return kind in ("ivf", "ivfpq")
+
+
+def make_index(kind: str, d: int, train_vecs: np.ndarray | None = None):
+    """Build an empty, trained, id-mapped inner-product index of the given kind.
+
+    IVF list counts and PQ code sizes are scaled down when there are too
+    few training vectors for the configured values.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE '{kind}', expected one of {INDEX_TYPES}")
+
+    if kind == "flat":
+        inner = faiss.IndexFlatIP(d)
+    elif kind == "hnsw":
+        inner = faiss.IndexHNSWFlat(d, settings.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+    else:
+        ntrain = len(train_vecs)
+        # FAISS wants ~39 training points per centroid
+        nlist = max(1, min(settings.IVF_NLIST, ntrain // 39))
+        quantizer = faiss.IndexFlatIP(d)
+        if kind == "ivf":
+            inner = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            m = settings.PQ_M
+            while d % m:
+                m -= 1
+            nbits = 8 if ntrain >= 256 else max(1, int(math.log2(ntrain)))
+            inner = faiss.IndexIVFPQ(quantizer, d, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+        inner.train(train_vecs)
+
+    index = faiss.IndexIDMap2(inner)
+    tune(index)
+    return index
+
+
+def inner_index(index):
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_kind(index) -> str | None:
+    """Return which of INDEX_TYPES an index was built as, if any"""
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(inner, faiss.IndexIVFFlat):
+        return "ivf"
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexFlat):
+        return "flat"
+    return None
+
+
+def tune(index, nprobe: int | None = None, ef_search: int | None = None):
+    """Apply query-time search parameters (they are not saved with the index)"""
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = nprobe or settings.IVF_NPROBE
+    elif isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search or settings.HNSW_EF_SEARCH
@@ -0,0 +1,192 @@
+# Local nearest-centroid intent classifier, trained on the LLM router's own labels
+import random
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from app.config import settings
+from tools.embedding_cache import normalize_text
+from tools.embeddings import HashingEmbeddings
+
+INTENTS = ("fitness", "nutrition", "health", "misc")
+
+
+class IntentClassifier:
+    """Answers confident routing decisions locally, in microseconds.
+
+    Messages are embedded with the local hashing backend and compared to
+    one centroid per intent. A prediction is used only when the best
+    centroid is similar enough and clearly ahead of the runner-up;
+    everything else goes to the LLM, whose label is logged to SQLite and
+    folded into the centroids. Nothing is trusted until min_examples
+    labels have been seen.
+    """
+
+    def __init__(self, path: str, dim: int = 1024, min_similarity: float = 0.2,
+                 margin: float = 0.08, min_examples: int = 40):
+        self.path = path
+        self.embedder = HashingEmbeddings(dim)
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self.min_examples = min_examples
+        self._sums = np.zeros((len(INTENTS), dim), dtype="float32")
+        self._counts = np.zeros(len(INTENTS), dtype="int64")
+        self._centroids = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # local: answered here; llm: sent on; shadow_*: local top-1 vs the LLM's label on those
+        self.stats = {"local": 0, "llm": 0, "shadow_total": 0, "shadow_agree": 0}
+        if path:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS intent_examples ("
+                "message TEXT PRIMARY KEY, intent TEXT NOT NULL, ts REAL NOT NULL)"
+            )
+            self.fit(self.examples())
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return normalize_text(text).lower()
+
+    def examples(self) -> list:
+        """Logged (message, intent) pairs"""
+        return self._conn().execute("SELECT message, intent FROM intent_examples").fetchall()
+
+    def fit(self, pairs):
+        """Rebuild the centroids from (message, intent) pairs"""
+        pairs = [(m, i) for m, i in pairs if i in INTENTS]
+        sums = np.zeros_like(self._sums)
+        counts = np.zeros_like(self._counts)
+        if pairs:
+            vecs = self.embedder.embed([self._normalize(m) for m, _ in pairs])
+            idx = np.array([INTENTS.index(i) for _, i in pairs])
+            np.add.at(sums, idx, vecs)
+            counts = np.bincount(idx, minlength=len(INTENTS))
+        with self._lock:
+            self._sums, self._counts, self._centroids = sums, counts, None
+
+    def _centroid_matrix(self):
+        with self._lock:
+            if self._centroids is None:
+                norms = np.linalg.norm(self._sums, axis=1, keepdims=True)
+                self._centroids = self._sums / np.maximum(norms, 1e-12)
+            return self._centroids
+
+    def similarities(self, text: str):
+        """Cosine similarity of text to each intent centroid, in INTENTS order"""
+        v = self.embedder.embed([self._normalize(text)])[0]
+        return self._centroid_matrix() @ v
+
+    def predict(self, text: str):
+        """(intent, similarity, confident) for text, or None before enough labels"""
+        if self._counts.sum() < self.min_examples:
+            return None
+        scores = self.similarities(text)
+        second, best = np.argsort(scores)[-2:]
+        sim = float(scores[best])
+        confident = sim >= self.min_similarity and sim - float(scores[second]) >= self.margin
+        return INTENTS[best], sim, confident
+
+    def classify(self, text: str) -> str | None:
+        """The intent if it can be decided locally, else None (ask the LLM)"""
+        prediction = self.predict(text)
+        if prediction is not None and prediction[2]:
+            self.stats["local"] += 1
+            return prediction[0]
+        self.stats["llm"] += 1
+        return None
+
+    def learn(self, text: str, intent: str):
+        """Record the LLM's label for text; repeated messages are only learned once"""
+        if intent not in INTENTS:
+            return
+        message = self._normalize(text)
+        prediction = self.predict(text)
+        if prediction is not None:
+            self.stats["shadow_total"] += 1
+            self.stats["shadow_agree"] += int(prediction[0] == intent)
+        if self.path:
+            cur = self._conn().execute(
+                "INSERT OR IGNORE INTO intent_examples VALUES (?, ?, ?)", (message, intent, time.time())
+            )
+            if cur.rowcount == 0:
+                return
+        v = self.embedder.embed([message])[0]
+        with self._lock:
+            self._sums[INTENTS.index(intent)] += v
+            self._counts[INTENTS.index(intent)] += 1
+            self._centroids = None
+
+    def report(self) -> dict:
+        total = self.stats["local"] + self.stats["llm"]
+        shadow = self.stats["shadow_total"]
+        return {
+            **self.stats,
+            "examples": int(self._counts.sum()),
+            "llm_calls_avoided": self.stats["local"] / total if total else 0.0,
+            # Measured on the messages that were ambiguous enough to send on
+            "shadow_accuracy": self.stats["shadow_agree"] / shadow if shadow else None,
+        }
+
+
+def evaluate(pairs, holdout: float = 0.2, seed: int = 0, **kwargs) -> dict:
+    """Hold out part of the logged LLM labels and measure the local tier on it.
+
+    coverage is the share of held-out messages answered locally (LLM calls
+    avoided); accuracy is agreement with the LLM label on those.
+    """
+    pairs = list(pairs)
+    random.Random(seed).shuffle(pairs)
+    n_test = max(1, int(len(pairs) * holdout))
+    test, train = pairs[:n_test], pairs[n_test:]
+    clf = IntentClassifier(None, **kwargs)
+    clf.min_examples = 0
+    clf.fit(train)
+    local = correct = 0
+    start = time.perf_counter()
+    for message, intent in test:
+        prediction = clf.predict(message)
+        if prediction[2]:
+            local += 1
+            correct += int(prediction[0] == intent)
+    us = (time.perf_counter() - start) / len(test) * 1e6
+    return {
+        "train": len(train),
+        "test": len(test),
+        "coverage": local / len(test),
+        "accuracy": correct / local if local else None,
+        "us_per_message": round(us, 1),
+    }
+
+
+intent_classifier = IntentClassifier(
+    settings.INTENT_LOG_PATH,
+    settings.INTENT_DIM,
+    settings.INTENT_MIN_SIMILARITY,
+    settings.INTENT_MARGIN,
+    settings.INTENT_MIN_EXAMPLES,
+) if settings.INTENT_CLASSIFIER_ENABLED else None
+
+
+if __name__ == "__main__":
+    if intent_classifier is None:
+        raise SystemExit("INTENT_CLASSIFIER_ENABLED is off")
+    pairs = intent_classifier.examples()
+    if len(pairs) < 10:
+        raise SystemExit(f"Only {len(pairs)} logged labels in {settings.INTENT_LOG_PATH}; route more messages first")
+    result = evaluate(pairs, dim=settings.INTENT_DIM, min_similarity=settings.INTENT_MIN_SIMILARITY,
+                      margin=settings.INTENT_MARGIN)
+    print(f"{result['test']} held-out LLM labels (trained on {result['train']}): "
+          f"{result['coverage']:.1%} answered locally, "
+          f"{(result['accuracy'] or 0):.1%} agree with the LLM, {result['us_per_message']} us/message")
@@ -0,0 +1,45 @@
+# Single-pass weighted keyword matching for rule-based routing
+import re
+from collections import defaultdict
+
+
+class KeywordMatcher:
+    """Scores text against weighted keyword lists for several domains.
+
+    All keywords (single words or phrases) are compiled once into one
+    alternation, longest first, anchored on word boundaries and allowing the
+    suffixes "s", "es", "ed", "d" and "ing" ("stressed", "sleeping", and
+    "exercising" via the keyword minus its final "e"). A single finditer
+    pass over the lowercased text adds each hit's weight to its domains, so
+    the result doesn't depend on which list happens to be checked first.
+    """
+
+    def __init__(self, domains: dict):
+        # keyword -> [(domain, weight)]; a keyword may count for several domains
+        self.weights = defaultdict(list)
+        for domain, keywords in domains.items():
+            for keyword, weight in keywords.items():
+                self.weights[keyword.lower()].append((domain, weight))
+        self.domains = tuple(domains)
+        # "exercis" + "ing" -> "exercise"; only ever matched with the "ing"
+        self.stems = {k[:-1]: k for k in self.weights if k.endswith("e") and len(k) > 3}
+        alternation = "|".join(re.escape(k) for k in sorted(self.weights, key=len, reverse=True))
+        stems = "|".join(re.escape(k) for k in sorted(self.stems, key=len, reverse=True)) or "(?!)"
+        self.pattern = re.compile(rf"\b(?:({alternation})(?:s|es|ed|d|ing)?|({stems})ing)\b")
+
+    def matches(self, text: str) -> list:
+        return [m.group(1) or self.stems[m.group(2)] for m in self.pattern.finditer(text.lower())]
+
+    def scores(self, text: str) -> dict:
+        """{domain: summed weight of its keywords found in text}"""
+        totals = dict.fromkeys(self.domains, 0.0)
+        for keyword in self.matches(text):
+            for domain, weight in self.weights[keyword]:
+                totals[domain] += weight
+        return totals
+
+    def best(self, text: str, default=None):
+        """Highest-scoring domain (ties go to the earlier domain), or default if nothing matched"""
+        totals = self.scores(text)
+        domain = max(self.domains, key=lambda d: totals[d])  # max keeps the first of equal scores
+        return domain if totals[domain] > 0 else default
@@ -0,0 +1,427 @@
+# Shared, pooled OpenAI client used by every agent and tool
+import asyncio
+import threading
+import time
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.config import settings
+from tools.llm_cache import ResponseCache
+from tools.resilience import (
+    CircuitBreaker, LLMUnavailable, RateLimiter, backoff_delay, is_retryable, retry_after,
+)
+from tools.single_flight import SingleFlight
+from tools.tracing import tracer
+
+POOL_LIMITS = httpx.Limits(
+    max_connections=settings.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+)
+POOL_TIMEOUT = httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+http_client = httpx.Client(limits=POOL_LIMITS, timeout=POOL_TIMEOUT)
+
+client = OpenAI(
+    api_key=settings.OPENAI_API_KEY,
+    base_url=settings.OPENAI_BASE_URL,
+    http_client=http_client,
+    max_retries=0,  # retries happen in _guarded, behind the shared limiter and breaker
+    timeout=settings.LLM_TIMEOUT,
+)
+
+# The async pool is bound to the event loop that first uses it, so it is
+# created lazily (one per loop) rather than at import time.
+_async_clients = {}
+
+
+def get_async_client() -> AsyncOpenAI:
+    loop = asyncio.get_running_loop()
+    aclient = _async_clients.get(loop)
+    if aclient is None:
+        for stale in [l for l in _async_clients if l.is_closed()]:
+            del _async_clients[stale]
+        aclient = _async_clients[loop] = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            http_client=httpx.AsyncClient(limits=POOL_LIMITS, timeout=POOL_TIMEOUT),
+            max_retries=0,
+            timeout=settings.LLM_TIMEOUT,
+        )
+    return aclient
+
+
+class CallStats:
+    """Per-call-site counters: calls, errors and latency"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sites = {}
+
+    def _site(self, site: str) -> dict:
+        return self.sites.setdefault(
+            site, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "streams": 0, "total_ttft_ms": 0.0}
+        )
+
+    def record(self, site: str, ms: float, error: bool = False):
+        with self._lock:
+            s = self._site(site)
+            s["calls"] += 1
+            s["errors"] += int(error)
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+
+    def record_ttft(self, site: str, ms: float):
+        """Time to first token of a streamed call"""
+        with self._lock:
+            s = self._site(site)
+            s["streams"] += 1
+            s["total_ttft_ms"] += ms
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                site: {
+                    **s,
+                    "avg_ms": s["total_ms"] / s["calls"] if s["calls"] else 0.0,
+                    "avg_ttft_ms": s["total_ttft_ms"] / s["streams"] if s["streams"] else 0.0,
+                }
+                for site, s in self.sites.items()
+            }
+
+
+call_stats = CallStats()
+
+response_cache = ResponseCache(
+    settings.LLM_CACHE_PATH,
+    settings.LLM_CACHE_SIZE,
+    settings.LLM_CACHE_TTL,
+    settings.LLM_PRICE_INPUT_PER_1M,
+    settings.LLM_PRICE_OUTPUT_PER_1M,
+)
+# Concurrent cache misses for the same key share one completion
+llm_flight = SingleFlight()
+
+# One quota and one breaker for the provider, shared by every call site
+limiter = RateLimiter(settings.LLM_RPM, settings.LLM_TPM)
+breaker = CircuitBreaker(settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_RESET)
+
+# Reply used by answering agents when the provider is unavailable
+UNAVAILABLE_REPLY = (
+    "I'm having trouble reaching my AI service right now, so I can't give you "
+    "a personalised answer. Please try again in a minute."
+)
+
+
+def _estimate_tokens(kwargs) -> int:
+    """Rough prompt + completion tokens for the tokens-per-minute quota"""
+    if "messages" in kwargs:
+        chars = sum(len(str(m.get("content", ""))) for m in kwargs["messages"])
+        return chars // 4 + (kwargs.get("max_tokens") or 256)
+    texts = kwargs.get("input") or []
+    return sum(len(t) for t in texts) // 4
+
+
+def _guarded(fn, **kwargs):
+    """One provider request behind the rate limiter and circuit breaker,
+    retried with jittered exponential backoff on 429/5xx/connection errors"""
+    tokens = _estimate_tokens(kwargs)
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        breaker.check()
+        try:
+            limiter.acquire(tokens)
+            result = fn(**kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                # The provider answered; a bad request says nothing about its health
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == settings.LLM_MAX_RETRIES or breaker.is_open:
+                raise LLMUnavailable(str(e)) from e
+            time.sleep(backoff_delay(attempt, settings.LLM_RETRY_BASE, settings.LLM_RETRY_MAX, retry_after(e)))
+            continue
+        except BaseException:
+            # Interrupted before any verdict; don't leave a half-open trial taken
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def _aguarded(fn, **kwargs):
+    """Async _guarded"""
+    tokens = _estimate_tokens(kwargs)
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        breaker.check()
+        try:
+            await limiter.aacquire(tokens)
+            result = await fn(**kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                # The provider answered; a bad request says nothing about its health
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == settings.LLM_MAX_RETRIES or breaker.is_open:
+                raise LLMUnavailable(str(e)) from e
+            await asyncio.sleep(backoff_delay(attempt, settings.LLM_RETRY_BASE, settings.LLM_RETRY_MAX, retry_after(e)))
+            continue
+        except BaseException:
+            # Cancelled before any verdict; don't leave a half-open trial taken
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
+
+
+def _record_usage(span, result):
+    usage = getattr(result, "usage", None)
+    if usage is not None:
+        span.set(
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+
+def _timed(site: str, fn, **kwargs):
+    with tracer.span(f"llm.{site}", site=site, model=kwargs.get("model")) as span:
+        start = time.perf_counter()
+        try:
+            result = _guarded(fn, **kwargs)
+        except Exception:
+            call_stats.record(site, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        call_stats.record(site, (time.perf_counter() - start) * 1000)
+        _record_usage(span, result)
+        return result
+
+
+def chat(site: str, messages: list, model: str | None = None, timeout: float | None = None, **kwargs):
+    """Chat completion through the shared client, timed under site"""
+    return _timed(
+        site,
+        client.chat.completions.create,
+        model=model or settings.CHAT_MODEL,
+        messages=messages,
+        timeout=timeout or settings.LLM_TIMEOUT,
+        **kwargs,
+    )
+
+
+def chat_text(site: str, prompt: str, **kwargs) -> str:
+    """Single user-prompt chat completion, returning the reply text"""
+    return chat(site, [{"role": "user", "content": prompt}], **kwargs).choices[0].message.content
+
+
+def _first_token(site: str, span, start: float):
+    ms = (time.perf_counter() - start) * 1000
+    span.set(ttft_ms=round(ms, 3))
+    call_stats.record_ttft(site, ms)
+    tracer.observe(f"llm.{site}.ttft", ms)
+
+
+def chat_stream(site: str, messages: list, model: str | None = None, timeout: float | None = None, **kwargs):
+    """Streaming chat completion; yields reply text deltas as they arrive"""
+    model = model or settings.CHAT_MODEL
+    with tracer.span(f"llm.{site}", site=site, model=model, stream=True) as span:
+        start = time.perf_counter()
+        first = True
+        try:
+            stream = _guarded(
+                client.chat.completions.create,
+                model=model,
+                messages=messages,
+                timeout=timeout or settings.LLM_TIMEOUT,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs,
+            )
+            for chunk in stream:
+                _record_usage(span, chunk)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    if first:
+                        _first_token(site, span, start)
+                        first = False
+                    yield delta
+        except Exception as e:
+            call_stats.record(site, (time.perf_counter() - start) * 1000, error=True)
+            if is_retryable(e):
+                # Failed mid-stream; too late to retry once tokens have gone out
+                breaker.record_failure()
+                raise LLMUnavailable(str(e)) from e
+            raise
+        call_stats.record(site, (time.perf_counter() - start) * 1000)
+
+
+def stream_text(site: str, prompt: str, on_token=None, fallback: str | None = None, **kwargs) -> str:
+    """Single user-prompt chat completion, returning the reply text.
+
+    With on_token, the reply is streamed and on_token is called with each
+    text delta as it arrives; without it this is plain chat_text. If the
+    provider is unavailable and fallback is given, fallback is the reply.
+    """
+    parts = []
+    try:
+        if on_token is None:
+            return chat_text(site, prompt, **kwargs)
+        for delta in chat_stream(site, [{"role": "user", "content": prompt}], **kwargs):
+            parts.append(delta)
+            on_token(delta)
+    except LLMUnavailable:
+        if fallback is None:
+            raise
+        return _fall_back(parts, fallback, on_token)
+    return "".join(parts)
+
+
+def _fall_back(parts: list, fallback: str, on_token) -> str:
+    text = ("\n\n" if parts else "") + fallback
+    if on_token is not None:
+        on_token(text)
+    return "".join(parts) + text
+
+
+def embed(site: str, texts: list, model: str | None = None, timeout: float | None = None):
+    """Embeddings request through the shared client, timed under site"""
+    return _timed(
+        site,
+        client.embeddings.create,
+        model=model or settings.EMBEDDING_MODEL,
+        input=texts,
+        timeout=timeout or settings.LLM_TIMEOUT,
+    )
+
+
+async def _atimed(site: str, fn, **kwargs):
+    with tracer.span(f"llm.{site}", site=site, model=kwargs.get("model")) as span:
+        start = time.perf_counter()
+        try:
+            result = await _aguarded(fn, **kwargs)
+        except Exception:
+            call_stats.record(site, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        call_stats.record(site, (time.perf_counter() - start) * 1000)
+        _record_usage(span, result)
+        return result
+
+
+async def achat(site: str, messages: list, model: str | None = None, timeout: float | None = None, **kwargs):
+    """Async chat completion on the shared async pool, timed under site"""
+    return await _atimed(
+        site,
+        get_async_client().chat.completions.create,
+        model=model or settings.CHAT_MODEL,
+        messages=messages,
+        timeout=timeout or settings.LLM_TIMEOUT,
+        **kwargs,
+    )
+
+
+async def achat_text(site: str, prompt: str, **kwargs) -> str:
+    """Async single user-prompt chat completion, returning the reply text"""
+    return (await achat(site, [{"role": "user", "content": prompt}], **kwargs)).choices[0].message.content
+
+
+async def achat_stream(site: str, messages: list, model: str | None = None, timeout: float | None = None, **kwargs):
+    """Async streaming chat completion; yields reply text deltas as they arrive"""
+    model = model or settings.CHAT_MODEL
+    with tracer.span(f"llm.{site}", site=site, model=model, stream=True) as span:
+        start = time.perf_counter()
+        first = True
+        try:
+            stream = await _aguarded(
+                get_async_client().chat.completions.create,
+                model=model,
+                messages=messages,
+                timeout=timeout or settings.LLM_TIMEOUT,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs,
+            )
+            async for chunk in stream:
+                _record_usage(span, chunk)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    if first:
+                        _first_token(site, span, start)
+                        first = False
+                    yield delta
+        except Exception as e:
+            call_stats.record(site, (time.perf_counter() - start) * 1000, error=True)
+            if is_retryable(e):
+                # Failed mid-stream; too late to retry once tokens have gone out
+                breaker.record_failure()
+                raise LLMUnavailable(str(e)) from e
+            raise
+        call_stats.record(site, (time.perf_counter() - start) * 1000)
+
+
+async def astream_text(site: str, prompt: str, on_token=None, fallback: str | None = None, **kwargs) -> str:
+    """Async stream_text"""
+    parts = []
+    try:
+        if on_token is None:
+            return await achat_text(site, prompt, **kwargs)
+        async for delta in achat_stream(site, [{"role": "user", "content": prompt}], **kwargs):
+            parts.append(delta)
+            on_token(delta)
+    except LLMUnavailable:
+        if fallback is None:
+            raise
+        return _fall_back(parts, fallback, on_token)
+    return "".join(parts)
+
+
+def cached_chat_text(site: str, version: str, cache_input, prompt: str, ttl: float | None = None, **kwargs) -> str:
+    """chat_text that reuses earlier replies for the same input.
+
+    Opt-in for deterministic call sites. version names the prompt template;
+    bump it whenever the template changes. cache_input is what actually
+    varies between calls (a string, or JSON-serializable data).
+    """
+    if not settings.LLM_CACHE_ENABLED:
+        return chat_text(site, prompt, **kwargs)
+    key = response_cache.key(kwargs.get("model") or settings.CHAT_MODEL, f"{site}:{version}", cache_input)
+    text = response_cache.get(site, key)
+    if text is None:
+        try:
+            text = llm_flight.do(key, _complete_and_cache, site, key, prompt, ttl, kwargs)
+        except LLMUnavailable:
+            # An expired answer beats none while the provider is down
+            text = response_cache.get_stale(key)
+            if text is None:
+                raise
+    return text
+
+
+def _complete_and_cache(site, key, prompt, ttl, kwargs) -> str:
+    response = chat(site, [{"role": "user", "content": prompt}], **kwargs)
+    text = response.choices[0].message.content
+    response_cache.put(key, text, getattr(response, "usage", None), ttl)
+    return text
+
+
+async def acached_chat_text(site: str, version: str, cache_input, prompt: str, ttl: float | None = None, **kwargs) -> str:
+    """Async cached_chat_text"""
+    if not settings.LLM_CACHE_ENABLED:
+        return await achat_text(site, prompt, **kwargs)
+    key = response_cache.key(kwargs.get("model") or settings.CHAT_MODEL, f"{site}:{version}", cache_input)
+    text = response_cache.get(site, key)
+    if text is None:
+        try:
+            text = await llm_flight.ado(key, _acomplete_and_cache, site, key, prompt, ttl, kwargs)
+        except LLMUnavailable:
+            text = response_cache.get_stale(key)
+            if text is None:
+                raise
+    return text
+
+
+async def _acomplete_and_cache(site, key, prompt, ttl, kwargs) -> str:
+    response = await achat(site, [{"role": "user", "content": prompt}], **kwargs)
+    text = response.choices[0].message.content
+    response_cache.put(key, text, getattr(response, "usage", None), ttl)
+    return text
@@ -0,0 +1,124 @@
+# Response cache for deterministic (low-temperature) LLM calls
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from tools.embedding_cache import normalize_text
+
+
+class ResponseCache:
+    """Caches reply text keyed on (model, prompt template version, normalized input).
+
+    An in-memory LRU sits in front of a WAL-mode SQLite file shared between
+    processes. Entries expire after a TTL. Each entry remembers the tokens
+    its original call used, so hits can be reported as dollars saved.
+    """
+
+    def __init__(self, path: str, max_items: int = 5000, ttl: float = 7 * 86400,
+                 price_in_per_1m: float = 0.0, price_out_per_1m: float = 0.0):
+        self.path = path
+        self.max_items = max_items
+        self.ttl = ttl
+        self.price_in_per_1m = price_in_per_1m
+        self.price_out_per_1m = price_out_per_1m
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"hits": 0, "misses": 0, "saved_usd": 0.0, "sites": {}}
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, prompt_tokens INTEGER, "
+            "completion_tokens INTEGER, expires REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(model: str, version: str, cache_input) -> str:
+        if not isinstance(cache_input, str):
+            cache_input = json.dumps(cache_input, sort_keys=True, default=str)
+        raw = f"{model}\0{version}\0{normalize_text(cache_input).lower()}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, site: str, hit: bool, entry=None):
+        with self._lock:
+            site_stats = self.stats["sites"].setdefault(site, {"hits": 0, "misses": 0})
+            if hit:
+                self.stats["hits"] += 1
+                site_stats["hits"] += 1
+                _, prompt_tokens, completion_tokens, _ = entry
+                self.stats["saved_usd"] += (
+                    (prompt_tokens or 0) * self.price_in_per_1m
+                    + (completion_tokens or 0) * self.price_out_per_1m
+                ) / 1e6
+            else:
+                self.stats["misses"] += 1
+                site_stats["misses"] += 1
+
+    def get(self, site: str, key: str):
+        """Return cached text or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and entry[3] > now:
+                self._lru.move_to_end(key)
+            else:
+                entry = None
+        if entry is None:
+            row = self._conn().execute(
+                "SELECT text, prompt_tokens, completion_tokens, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[3] > now:
+                entry = row
+                self._remember(key, entry)
+        self._count(site, entry is not None, entry)
+        return entry[0] if entry is not None else None
+
+    def get_stale(self, key: str):
+        """Return cached text for key even if it has expired, or None"""
+        row = self._conn().execute("SELECT text FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+
+    def put(self, key: str, text: str, usage=None, ttl: float | None = None):
+        entry = (
+            text,
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None),
+            time.time() + (ttl or self.ttl),
+        )
+        self._remember(key, entry)
+        self._conn().execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, *entry))
+
+    def purge_expired(self):
+        self._conn().execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def report(self) -> dict:
+        return {
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "hit_rate": self.hit_rate(),
+            "saved_usd": round(self.stats["saved_usd"], 6),
+            "sites": {site: dict(s) for site, s in self.stats["sites"].items()},
+        }
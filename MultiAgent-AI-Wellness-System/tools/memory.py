@@ -0,0 +1,261 @@
+# Per-user conversation memory: recent turns under a token budget plus a rolling summary
+import asyncio
+import json
+import queue
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, select
+
+from app.config import settings
+from tools.db import Conversation, engine, get_session
+from tools.events import LoggerSink, emit, use_sink
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count, the same chars/4 estimate the rate limiter uses"""
+    return len(text) // 4 + 1
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+def recent_messages(messages: list) -> list:
+    """The last HISTORY_MAX_MESSAGES items; none when it is 0 (a [-0:] slice would keep them all)"""
+    n = settings.HISTORY_MAX_MESSAGES
+    return messages[-n:] if n > 0 else []
+
+
+def format_conversation(summary: str, history: list) -> str:
+    """Prompt section with the conversation so far, or "" for a new conversation"""
+    if not summary and not history:
+        return ""
+    lines = ["Conversation so far:"]
+    if summary:
+        lines.append(f"(Summary of earlier turns) {summary}")
+    for m in history:
+        lines.append(f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}")
+    return "\n".join(lines) + "\n"
+
+
+class ConversationMemory:
+    """Keeps each user's conversation in one Conversation row.
+
+    Recent messages are kept verbatim while they fit in token_budget. Once
+    they overflow, the oldest are folded into a summary of at most
+    summary_tokens by one LLM call, down to half the budget so that call
+    happens every few turns rather than on each one. The prompt context is
+    therefore bounded by token_budget + summary_tokens however long the
+    conversation runs.
+
+    Recording a turn is a quick append; the summary call runs afterwards on
+    a background thread, so a reply never waits for it. Every write is
+    conditional on the row's updated_at being the one that was read, and
+    retried or dropped otherwise, so concurrent turns in several processes
+    (e.g. API workers) don't lose each other's messages. A per-user lock
+    keeps threads in one process from retrying against each other.
+    """
+
+    def __init__(self, token_budget: int = 600, summary_tokens: int = 150):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        SQLModel.metadata.create_all(engine, tables=[Conversation.__table__])
+        self.stats = {"turns": 0, "summaries": 0, "summary_failures": 0}
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+        self._pending = set()  # users queued for a summary update
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def _lock(self, user: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks[user]
+
+    def _read(self, user: str) -> tuple:
+        """(summary, every stored message, updated_at), including overflow not yet folded.
+
+        updated_at is None when the user has no row yet.
+        """
+        with get_session() as s:
+            row = s.exec(select(Conversation).where(Conversation.user == user)).first()
+        if row is None:
+            return "", [], None
+        return row.summary, json.loads(row.turns), row.updated_at
+
+    def load(self, user: str) -> tuple:
+        """(summary, recent messages) for user, in one query.
+
+        Only the newest messages that fit in token_budget are returned, so
+        the prompt stays the same size while a summary update is pending or
+        failing.
+        """
+        summary, turns, _ = self._read(user)
+        return summary, self._window(turns)
+
+    def clear(self, user: str):
+        with self._lock(user), get_session() as s:
+            row = s.exec(select(Conversation).where(Conversation.user == user)).first()
+            if row is not None:
+                s.delete(row)
+                s.commit()
+
+    def _split(self, turns: list) -> tuple:
+        """(kept, overflow): the oldest messages leave once the window is over budget"""
+        total = sum(count_tokens(m["content"]) for m in turns)
+        if total <= self.token_budget:
+            return turns, []
+        cut = 0
+        while cut < len(turns) - 2 and total > self.token_budget // 2:
+            total -= count_tokens(turns[cut]["content"])
+            cut += 1
+        return turns[cut:], turns[:cut]
+
+    def _window(self, turns: list) -> list:
+        """The newest messages that fit in token_budget"""
+        total = 0
+        for i in range(len(turns) - 1, -1, -1):
+            total += count_tokens(turns[i]["content"])
+            if total > self.token_budget:
+                return turns[i + 1:]
+        return turns
+
+    def _summary_prompt(self, summary: str, overflow: list) -> str:
+        words = int(self.summary_tokens * 0.75)
+        return (
+            f"You maintain a running summary of a wellness coaching conversation.\n\n"
+            f"Current summary: {summary or '(none yet)'}\n\n"
+            f"{format_conversation('', overflow)}\n"
+            f"Update the summary with these turns. Keep the user's goals, preferences, "
+            f"health details and any advice already given. At most {words} words, plain text."
+        )
+
+    def _append(self, turns: list, message: str, reply: str) -> list:
+        # One long message can't push everything else out of the window
+        limit = self.token_budget // 4
+        return turns + [
+            {"role": "user", "content": _clip(message, limit)},
+            {"role": "assistant", "content": _clip(reply, limit)},
+        ]
+
+    def _save(self, user: str, summary: str, turns: list, summarized: int, stamp) -> bool:
+        """Write user's row if it is still the one read at stamp; False if another writer got there first"""
+        now = datetime.now(timezone.utc)
+        with get_session() as s:
+            if stamp is None:
+                s.add(Conversation(user=user, summary=summary, turns=json.dumps(turns), summarized=summarized, updated_at=now))
+                try:
+                    s.commit()
+                except IntegrityError:
+                    # Created by a concurrent turn
+                    s.rollback()
+                    return False
+                return True
+            result = s.exec(
+                update(Conversation)
+                .where(Conversation.user == user, Conversation.updated_at == stamp)
+                .values(
+                    summary=summary, turns=json.dumps(turns),
+                    summarized=Conversation.summarized + summarized, updated_at=now,
+                )
+            )
+            s.commit()
+            return result.rowcount == 1
+
+    def _folded(self, overflow: list):
+        self.stats["summaries"] += 1
+        emit(f"🧠 MEMORY: Folded {len(overflow)} messages into the summary")
+
+    def _summary_failed(self, e: Exception, turns: list) -> list:
+        # Keep the old summary and carry the turns; the next turn tries again
+        emit(f"⚠️ MEMORY: Summary update failed: {e}")
+        self.stats["summary_failures"] += 1
+        return recent_messages(turns)
+
+    def remember(self, user: str, message: str, reply: str):
+        """Record a finished turn; overflow is summarized in the background"""
+        with self._lock(user):
+            while True:
+                summary, turns, stamp = self._read(user)
+                turns = self._append(turns, message, reply)
+                if self._save(user, summary, turns, 0, stamp):
+                    break
+        self.stats["turns"] += 1
+        if self._split(turns)[1]:
+            self._schedule(user)
+
+    async def aremember(self, user: str, message: str, reply: str):
+        """Async remember: the append runs in a worker thread"""
+        await asyncio.to_thread(self.remember, user, message, reply)
+
+    def _schedule(self, user: str):
+        with self._locks_guard:
+            if user in self._pending:
+                return
+            self._pending.add(user)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="memory-summarizer", daemon=True)
+                self._worker.start()
+        self._queue.put(user)
+
+    def _run(self):
+        # No request context here, so events go to the log rather than a chat page
+        with use_sink(LoggerSink()):
+            while True:
+                user = self._queue.get()
+                with self._locks_guard:
+                    self._pending.discard(user)
+                try:
+                    self.fold(user)
+                except Exception as e:
+                    emit(f"⚠️ MEMORY: Summary update failed: {e}")
+                finally:
+                    self._queue.task_done()
+
+    def fold(self, user: str):
+        """Fold the messages that fell out of user's window into the summary.
+
+        The LLM call runs without the user's lock; the result is only saved
+        if the summary and the folded messages are still what was read, so a
+        clear or another fold in the meantime wins. A save that loses a race
+        is dropped, and the user's next turn schedules the fold again.
+        """
+        from tools.llm import chat_text
+
+        summary, turns, _ = self._read(user)
+        overflow = self._split(turns)[1]
+        if not overflow:
+            return
+        try:
+            text = chat_text(
+                "memory.summarize", self._summary_prompt(summary, overflow),
+                temperature=0.2, max_tokens=self.summary_tokens,
+            )
+        except Exception as e:
+            with self._lock(user):
+                summary, turns, stamp = self._read(user)
+                kept = self._summary_failed(e, turns)
+                if stamp is not None and len(kept) < len(turns):
+                    self._save(user, summary, kept, 0, stamp)
+            return
+        with self._lock(user):
+            current, turns, stamp = self._read(user)
+            if stamp is None or current != summary or turns[:len(overflow)] != overflow:
+                return
+            new_summary = _clip(text.strip(), self.summary_tokens)
+            if self._save(user, new_summary, turns[len(overflow):], len(overflow), stamp):
+                self._folded(overflow)
+
+    def flush(self):
+        """Wait for queued summary updates, e.g. before a benchmark reads the results"""
+        self._queue.join()
+
+
+memory = ConversationMemory(
+    settings.MEMORY_TOKEN_BUDGET,
+    settings.MEMORY_SUMMARY_TOKENS,
+) if settings.MEMORY_ENABLED else None
@@ -1,11 +1,8 @@
 # Nutrition calculator using LLM to estimate calories and macros
-from openai import OpenAI
-from app.config import settings
+from tools.llm import cached_chat_text
 import json
 import re
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 class NutritionCalculator:
     """Calculates calories and macros for food items using LLM"""
     
@@ -41,13 +38,10 @@ class NutritionCalculator:
         """
         
         try:
-            response = client.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
+            result_text = cached_chat_text(
+                "nutrition_calculator.calculate", "v1", food_items, prompt,
                 temperature=0.1
-            )
-            
-            result_text = response.choices[0].message.content.strip()
+            ).strip()
             
             # Extract JSON from response
             json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
@@ -1,10 +1,7 @@
 # Profile analyzer for BMI, body age, and goal setting
-from openai import OpenAI
-from app.config import settings
+from tools.llm import cached_chat_text
 import json
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 class ProfileAnalyzer:
     """Analyzes user profile to calculate BMI, body age, and set goals"""
     
@@ -61,13 +58,16 @@ class ProfileAnalyzer:
         """
         
         try:
-            response = client.chat.completions.create(
-                model=settings.CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
+            # Only the fields the prompt uses, so unrelated profile edits still hit the cache
+            cache_input = {
+                field: profile_data.get(field)
+                for field in ("age", "bmi", "activity_level", "sleep_hours", "stress_level",
+                              "smoking", "alcohol_frequency", "health_conditions")
+            }
+            result_text = cached_chat_text(
+                "profile_analyzer.body_age", "v1", cache_input, prompt,
                 temperature=0.1
-            )
-            
-            result_text = response.choices[0].message.content.strip()
+            ).strip()
             
             # Extract JSON from response
             import re
@@ -1,36 +1,478 @@
-import faiss, os, json, numpy as np
-from openai import OpenAI
+import faiss, os, time, hashlib, threading, numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from app.config import settings
+from tools.embedding_cache import EmbeddingCache
+from tools.embeddings import get_backend
+from tools.chunk_store import ChunkStore
+from tools.index_factory import make_index, index_kind, needs_training, tune
+from tools.single_flight import SingleFlight
+from tools.tracing import tracer
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+INDEX_DIR = "data"
+# Single index written before per-domain partitions; still served if no partitions exist
 INDEX_PATH = "data/embeddings.index"
-META_PATH = "data/meta.json"
+META_PATH = "data/meta.db"
+LEGACY_META_PATH = "data/meta.json"
+DOCS_DIR = "data/seed_docs"
+
+# Seed doc file stem -> router intent; other files form a domain named after their stem
+FILE_DOMAINS = {"fitness": "fitness", "nutrition": "nutrition", "medical": "health"}
+
+backend = get_backend()
+embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_SIZE)
+# Identical concurrent cache misses (e.g. a popular query) share one embeddings request
+embed_flight = SingleFlight()
 
 def embed_texts(texts):
-    r = client.embeddings.create(model=settings.EMBEDDING_MODEL, input=texts)
-    vecs = [d.embedding for d in r.data]
-    return np.array(vecs).astype("float32")
-
-def build_index():
-    docs, metas = [], []
-    for f in os.listdir("data/seed_docs"):
-        path = os.path.join("data/seed_docs", f)
-        txt = open(path, "r", encoding="utf-8").read()
-        for i, chunk in enumerate(txt.split("\n\n")):
-            docs.append(chunk)
-            metas.append({"file": f, "chunk": i})
-    vecs = embed_texts(docs)
-    faiss.normalize_L2(vecs)
-    index = faiss.IndexFlatIP(vecs.shape[1])
-    index.add(vecs)
-    faiss.write_index(index, INDEX_PATH)
-    json.dump({"docs": docs, "metas": metas}, open(META_PATH, "w"))
-    print("FAISS index built.")
-
-def search(query, k=3):
-    index = faiss.read_index(INDEX_PATH)
-    meta = json.load(open(META_PATH))
-    qv = embed_texts([query])
-    faiss.normalize_L2(qv)
-    D, I = index.search(qv, k)
-    return [meta["docs"][i] for i in I[0] if i != -1]
+    """Embed texts with the configured backend, skipping ones already cached"""
+    if not backend.cacheable:
+        return backend.embed(list(texts))
+    cached = embedding_cache.get_many(backend.model_name, texts)
+    todo = [i for i, v in enumerate(cached) if v is None]
+    if todo:
+        # Repeated texts within one batch only need embedding once
+        unique = list(dict.fromkeys(texts[i] for i in todo))
+        fresh = embed_flight.do((backend.model_name, tuple(unique)), _embed_and_cache, unique)
+        by_text = dict(zip(unique, fresh))
+        for i in todo:
+            cached[i] = by_text[texts[i]]
+    return np.array(cached).astype("float32")
+
+
+def _embed_and_cache(texts):
+    vecs = backend.embed(texts)
+    embedding_cache.put_many(backend.model_name, texts, vecs)
+    return vecs
+
+
+def domain_for_file(name: str) -> str:
+    stem = os.path.splitext(name)[0].lower()
+    return FILE_DOMAINS.get(stem, stem)
+
+
+def partition_path(domain: str) -> str:
+    return os.path.join(INDEX_DIR, f"embeddings.{domain}.index")
+
+
+def list_partitions() -> dict:
+    """{domain: path} for every per-domain sub-index on disk"""
+    out = {}
+    for name in os.listdir(INDEX_DIR):
+        if name.startswith("embeddings.") and name.endswith(".index") and name.count(".") == 2:
+            out[name.split(".")[1]] = os.path.join(INDEX_DIR, name)
+    return out
+
+
+class Retriever:
+    """Process-wide holder for the per-domain FAISS sub-indexes.
+
+    Each sub-index is opened memory-mapped once and kept resident. The
+    partition list and file mtimes are only rechecked when the ChunkStore
+    generation changes (once per index build), and a sub-index whose file
+    changed is reloaded then; a search otherwise touches no files.
+    Chunk text comes from the ChunkStore, and only for the top-k hits.
+    """
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._snapshots = {}  # path -> (index, mtime, generation), each swapped as one tuple
+        self._domains = None  # (store generation, {domain: files})
+        self._partitions = None  # (store generation, {domain: path}, paths to scan when there are none)
+        self.stats = {
+            "loads": 0, "hits": 0, "last_load_ms": 0.0,
+            "embeddings": 0, "embeddings_skipped": 0, "vector_ms_avg": 0.0,
+        }
+        # Per-query latency / API-call reports for the most recent searches
+        self.reports = deque(maxlen=1000)
+        self.last_report = None
+
+    def _load(self, path, mtime):
+        start = time.perf_counter()
+        index = None
+        if settings.INDEX_MMAP:
+            try:
+                index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                # Not every index type can be mapped; fall back to a private copy
+                index = None
+        if index is None:
+            index = faiss.read_index(path)
+        tune(index)
+        self.stats["loads"] += 1
+        self.stats["last_load_ms"] = (time.perf_counter() - start) * 1000
+        return (index, mtime)
+
+    def get(self, path, generation=None):
+        """Return the index at path, reloading if the file changed.
+
+        With the store generation the mtime is only checked the first time
+        the index is used in that generation.
+        """
+        snapshot = self._snapshots.get(path)
+        if snapshot is not None and generation is not None and snapshot[2] == generation:
+            self.stats["hits"] += 1
+            return snapshot[0]
+        mtime = os.path.getmtime(path)
+        if snapshot is None or snapshot[1] != mtime:
+            with self._lock:
+                snapshot = self._snapshots.get(path)
+                if snapshot is None or snapshot[1] != mtime:
+                    snapshot = self._load(path, mtime)
+        else:
+            self.stats["hits"] += 1
+        self._snapshots[path] = (snapshot[0], mtime, generation)
+        return snapshot[0]
+
+    def swap(self, path, index):
+        """Atomically replace a resident sub-index, e.g. right after a rebuild."""
+        self._snapshots[path] = (index, os.path.getmtime(path), None)
+        self._partitions = None
+
+    def _paths(self, domain=None, generation=None):
+        """Sub-index files to scan: the domain's own if it has one, else all"""
+        cached = self._partitions
+        if cached is None or generation is None or cached[0] != generation:
+            legacy = [INDEX_PATH] if os.path.exists(INDEX_PATH) else []
+            cached = self._partitions = (generation, list_partitions(), legacy)
+        _, parts, legacy = cached
+        if domain in parts:
+            return [parts[domain]]
+        if parts:
+            return list(parts.values())
+        return legacy
+
+    def _vector_search(self, qv, k, domain=None):
+        """Search the relevant sub-indexes and merge the per-row top-k by score"""
+        generation = self.store.generation()
+        results = [self.get(path, generation).search(qv, k) for path in self._paths(domain, generation)]
+        if not results:
+            return np.full((len(qv), k), -np.inf, "float32"), np.full((len(qv), k), -1, "int64")
+        if len(results) == 1:
+            return results[0]
+        D = np.concatenate([d for d, _ in results], axis=1)
+        I = np.concatenate([i for _, i in results], axis=1)
+        D = np.where(I == -1, -np.inf, D)
+        order = np.argsort(-D, axis=1)[:, :k]
+        return np.take_along_axis(D, order, 1), np.take_along_axis(I, order, 1)
+
+    def _domain_files(self, domain):
+        if domain is None:
+            return None
+        # Worked out once per store generation, i.e. once per index build
+        generation = self.store.generation()
+        domains = self._domains
+        if domains is None or domains[0] != generation:
+            by_domain = {}
+            for f in self.store.file_names(generation):
+                by_domain.setdefault(domain_for_file(f), []).append(f)
+            domains = self._domains = (generation, by_domain)
+        # Unknown domain: search everything rather than nothing
+        return domains[1].get(domain)
+
+    def search(self, query, k=3, mode=None, domain=None):
+        """Return the top-k chunk texts for query.
+
+        mode is "vector", "lexical" or "hybrid" (default SEARCH_MODE). Hybrid
+        runs BM25 first and only embeds the query when the lexical match is
+        not confident enough; otherwise the two rankings are fused with RRF.
+        domain (a router intent such as "fitness") restricts both to that
+        domain's chunks; unknown domains search everything.
+        """
+        mode = mode or settings.SEARCH_MODE
+        report = {"query": query, "mode": mode, "domain": domain, "embedded": False, "lexical_ms": 0.0, "vector_ms": 0.0}
+        lexical, confidence = [], 0.0
+
+        if mode in ("lexical", "hybrid"):
+            start = time.perf_counter()
+            lexical, confidence = self.store.lexical_search(query, k, self._domain_files(domain))
+            report["lexical_ms"] = (time.perf_counter() - start) * 1000
+            report["lexical_confidence"] = confidence
+
+        if mode == "lexical" or (mode == "hybrid" and confidence >= settings.LEXICAL_CONFIDENCE):
+            ids = [cid for cid, _ in lexical]
+            if mode == "hybrid":
+                self.stats["embeddings_skipped"] += 1
+                # What the skipped round trip would have cost, on recent evidence
+                report["saved_ms"] = self.stats["vector_ms_avg"]
+        else:
+            start = time.perf_counter()
+            qv = embed_texts([query])
+            faiss.normalize_L2(qv)
+            D, I = self._vector_search(qv, k, domain)
+            vector_ms = (time.perf_counter() - start) * 1000
+            report["vector_ms"] = vector_ms
+            report["embedded"] = True
+            self.stats["embeddings"] += 1
+            n = self.stats["embeddings"]
+            self.stats["vector_ms_avg"] += (vector_ms - self.stats["vector_ms_avg"]) / n
+            ids = [int(i) for i in I[0] if i != -1]
+            if lexical:
+                ids = rrf_fuse([ids, [cid for cid, _ in lexical]], k)
+
+        rows = self.store.get_many(ids)
+        self.last_report = report
+        self.reports.append(report)
+        # An id can briefly be missing from the store while a rebuild swaps files
+        return [rows[i]["text"] for i in ids if i in rows]
+
+    def search_many(self, queries, k=3, batch_size=None, domain=None):
+        """Vector search for many queries at once.
+
+        Queries are embedded in batches and each batch runs as one multi-row
+        FAISS search. Returns one list per query, in input order, of
+        {"id", "text", "file", "chunk", "score"} dicts.
+        """
+        batch_size = batch_size or settings.EMBED_BATCH_SIZE
+        results = []
+        for start in range(0, len(queries), batch_size):
+            qv = embed_texts(list(queries[start:start + batch_size]))
+            faiss.normalize_L2(qv)
+            D, I = self._vector_search(qv, k, domain)
+            rows = self.store.get_many({int(i) for i in I.ravel() if i != -1})
+            for scores, ids in zip(D, I):
+                results.append([
+                    {"id": int(i), "score": float(d), **rows[int(i)]}
+                    for d, i in zip(scores, ids)
+                    if i != -1 and int(i) in rows
+                ])
+        return results
+
+
+def rrf_fuse(rankings, k, c=60):
+    """Reciprocal-rank fusion of several ranked id lists"""
+    scores = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (c + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+chunk_store = ChunkStore(META_PATH)
+chunk_store.migrate_json(LEGACY_META_PATH)
+chunk_store.ensure_postings()
+retriever = Retriever(chunk_store)
+
+def chunk_id(file: str, text: str) -> int:
+    """Stable 63-bit FAISS id derived from a chunk's content hash"""
+    digest = hashlib.sha256(f"{file}\0{text}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def _load_existing():
+    """Return {domain: index} from disk if every sub-index can be updated in place"""
+    parts = list_partitions()
+    if not parts:
+        return None
+    if chunk_store.get_meta("embedding_model") != backend.model_name:
+        # Built with another embedding model (or before the model was recorded):
+        # its vectors live in a different space, even at the same dimension
+        return None
+    indexes = {}
+    for domain, path in parts.items():
+        index = faiss.read_index(path)
+        if not isinstance(index, faiss.IndexIDMap2) or index_kind(index) != settings.INDEX_TYPE:
+            # Built as another INDEX_TYPE; start over once
+            return None
+        if backend.dim is not None and index.d != backend.dim:
+            return None
+        tune(index)
+        indexes[domain] = index
+    return indexes
+
+
+class _RebuildRequired(Exception):
+    """The existing index can't be updated in place"""
+
+
+def iter_paragraphs(path: str, block_size: int = 1 << 16):
+    """Yield a file's "\n\n"-separated chunks without reading it whole"""
+    buf = ""
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            parts = (buf + block).split("\n\n")
+            buf = parts.pop()
+            yield from parts
+    yield buf
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for request budgeting
+    return len(text) // 4 + 1
+
+
+def iter_batches(items, max_tokens: int, max_items: int):
+    """Pack (cid, text, ...) items into batches under a token and item budget"""
+    batch, tokens = [], 0
+    for item in items:
+        cost = estimate_tokens(item[1])
+        if batch and (tokens + cost > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += cost
+    if batch:
+        yield batch
+
+
+def embed_batches(batches, max_in_flight: int):
+    """Embed batches on a thread pool, yielding (batch, vecs) as each finishes.
+
+    At most max_in_flight batches are pending, so the input generator is
+    only pulled as fast as the API drains it.
+    """
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pending = {}
+        for batch in batches:
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield pending.pop(fut), fut.result()
+            pending[pool.submit(embed_texts, [item[1] for item in batch])] = batch
+        for fut in list(pending):
+            yield pending.pop(fut), fut.result()
+
+
+def build_index(full: bool = False):
+    """Bring the per-domain sub-indexes in line with DOCS_DIR.
+
+    Each seed file belongs to a domain (see FILE_DOMAINS) and each domain
+    gets its own sub-index, so a domain-scoped search only scans its
+    partition. Chunks are identified by a hash of their file and text, so
+    unchanged chunks keep their vectors and removed chunks are deleted by
+    id. New chunks stream through token-budgeted batches that are embedded
+    concurrently and appended as they come back. Chunk text goes to the
+    ChunkStore, along with its BM25 postings, in the same pass and is never
+    held in memory.
+    Trainable index types (see INDEX_TYPE) buffer the first
+    INDEX_TRAIN_SIZE vectors of each new sub-index to train on.
+    Pass full=True to force a rebuild from scratch.
+    """
+    indexes = None if full else _load_existing()
+    full = indexes is None
+    indexes = indexes or {}
+    old_sigs = {} if full else chunk_store.file_signatures()
+    old_ids = {} if full else chunk_store.id_files()
+    seen = set()
+    dirty = set()
+    added = 0
+
+    try:
+        with chunk_store.transaction() as conn:
+            if full:
+                chunk_store.clear(conn)
+
+            def new_chunks():
+                for f in sorted(os.listdir(DOCS_DIR)):
+                    path = os.path.join(DOCS_DIR, f)
+                    st = os.stat(path)
+                    sig = (st.st_size, st.st_mtime_ns)
+                    if old_sigs.get(f) == sig:
+                        # File untouched since the last build: keep its rows as-is
+                        seen.update(r[0] for r in conn.execute("SELECT id FROM chunks WHERE file = ?", (f,)))
+                        continue
+                    chunk_store.delete_file(conn, f)
+                    domain = domain_for_file(f)
+                    for i, text in enumerate(iter_paragraphs(path)):
+                        cid = chunk_id(f, text)
+                        if cid in seen:
+                            continue
+                        seen.add(cid)
+                        chunk_store.add_chunk(conn, cid, f, i, text)
+                        if cid not in old_ids:
+                            yield cid, text, domain
+                    conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (f, *sig))
+
+            kind = settings.INDEX_TYPE
+            train_size = settings.INDEX_TRAIN_SIZE if needs_training(kind) else 0
+            buffered = {}  # domain -> [(ids, vecs)] held back until there is enough to train on
+
+            def flush(domain):
+                vecs = np.concatenate([v for _, v in buffered[domain]])
+                ids = np.concatenate([i for i, _ in buffered.pop(domain)])
+                indexes[domain] = make_index(kind, vecs.shape[1], vecs)
+                indexes[domain].add_with_ids(vecs, ids)
+
+            batches = iter_batches(new_chunks(), settings.EMBED_BATCH_TOKENS, settings.EMBED_BATCH_SIZE)
+            for batch, vecs in embed_batches(batches, settings.EMBED_MAX_IN_FLIGHT):
+                faiss.normalize_L2(vecs)
+                added += len(batch)
+                domains = np.array([domain for _, _, domain in batch])
+                all_ids = np.array([cid for cid, _, _ in batch], dtype="int64")
+                for domain in set(domains):
+                    mask = domains == domain
+                    ids, dvecs = all_ids[mask], vecs[mask]
+                    dirty.add(domain)
+                    index = indexes.get(domain)
+                    if index is None:
+                        buffered.setdefault(domain, []).append((ids, dvecs))
+                        if sum(len(i) for i, _ in buffered[domain]) >= train_size:
+                            flush(domain)
+                        continue
+                    if index.d != vecs.shape[1]:
+                        # Embedding model changed: old vectors are incompatible
+                        raise _RebuildRequired()
+                    index.add_with_ids(dvecs, ids)
+            for domain in list(buffered):
+                flush(domain)
+
+            removed = {}
+            for cid, f in old_ids.items():
+                if cid not in seen:
+                    removed.setdefault(domain_for_file(f), []).append(cid)
+            for domain, ids in removed.items():
+                if domain in indexes:
+                    dirty.add(domain)
+                    try:
+                        indexes[domain].remove_ids(np.array(ids, dtype="int64"))
+                    except RuntimeError:
+                        # HNSW graphs don't support deletion
+                        raise _RebuildRequired()
+            current = set(os.listdir(DOCS_DIR))
+            for name in set(old_sigs) - current:
+                chunk_store.delete_file(conn, name)
+                conn.execute("DELETE FROM files WHERE name = ?", (name,))
+
+            live = {domain_for_file(f) for f in current}
+            for domain in list(indexes):
+                if domain not in live:
+                    del indexes[domain]
+            chunk_store.refresh_stats(conn)
+            chunk_store.set_meta(conn, "embedding_model", backend.model_name)
+            for domain in dirty & set(indexes):
+                # Commit the store first: the retriever skips ids it can't find,
+                # so rows briefly outliving their vectors (or vice versa) are harmless
+                faiss.write_index(indexes[domain], partition_path(domain) + ".tmp")
+    except _RebuildRequired:
+        # Unchanged chunks come back from the embedding cache, so this is cheap
+        return build_index(full=True)
+
+    for domain in dirty & set(indexes):
+        path = partition_path(domain)
+        os.replace(path + ".tmp", path)
+        retriever.swap(path, indexes[domain])
+    for domain, path in list_partitions().items():
+        if domain not in indexes:
+            os.remove(path)
+    with chunk_store.transaction() as conn:
+        # Readers only re-list partitions when the generation changes; the
+        # build's own bump committed before the files above were in place
+        chunk_store.bump_generation(conn)
+    n_removed = sum(len(ids) for ids in removed.values())
+    print(f"FAISS index updated: {added} added, {n_removed} removed, {len(seen)} total "
+          f"across {len(indexes)} domains ({', '.join(sorted(indexes))}).")
+
+def search(query, k=3, mode=None, domain=None):
+    with tracer.span("rag.search", k=k, domain=domain) as span:
+        results = retriever.search(query, k, mode, domain)
+        report = retriever.last_report or {}
+        span.set(mode=report.get("mode"), embedded=report.get("embedded"), results=len(results))
+        return results
+
+def search_many(queries, k=3, domain=None):
+    with tracer.span("rag.search_many", k=k, domain=domain, queries=len(queries)):
+        return retriever.search_many(queries, k, domain=domain)
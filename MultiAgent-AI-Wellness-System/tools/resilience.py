@@ -0,0 +1,148 @@
+# Rate limiting, retry-with-backoff and circuit breaking for the LLM provider
+import random
+import threading
+import time
+
+
+class LLMUnavailable(Exception):
+    """The provider can't be used right now: the circuit is open or retries ran out"""
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 units a second up to burst.
+
+    reserve() takes units immediately, letting the level go negative, and
+    returns how long the caller must wait before using them. No lock is held
+    while waiting, so the same bucket serves threads and asyncio tasks.
+    """
+
+    def __init__(self, per_minute: float, burst: float | None = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, n: float = 1) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= min(n, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute quotas shared by every call site"""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+        self.stats = {"waits": 0, "wait_ms": 0.0}
+
+    def _reserve(self, tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait:
+            with self._lock:
+                self.stats["waits"] += 1
+                self.stats["wait_ms"] += wait * 1000
+        return wait
+
+    def acquire(self, tokens: int = 0):
+        wait = self._reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        import asyncio
+        wait = self._reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after threshold consecutive failures and rejects calls until
+    reset_timeout has passed; then lets one trial call through (half-open)
+    and closes again if it succeeds."""
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        """Raise LLMUnavailable unless a call may go ahead"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return
+            self.stats["rejected"] += 1
+        raise LLMUnavailable("LLM circuit breaker is open")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                if self.opened_at is None or self._trial:
+                    self.stats["opened"] += 1
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+    def release(self):
+        """Give up a half-open trial that ended without a verdict (cancelled,
+        interrupted), so the next call can take the trial instead"""
+        with self._lock:
+            self._trial = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open"
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff, never shorter than a server Retry-After"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+
+def is_retryable(error: Exception) -> bool:
+    """429s, 5xx responses, timeouts and connection errors are worth retrying"""
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):  # APITimeoutError is a connection error
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,81 @@
+# Single-flight: concurrent identical calls share one upstream request
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight wait and receive the same result or
+    exception. Nothing is remembered once the call completes, so this sits
+    in front of a cache rather than replacing one.
+
+    do() coalesces across threads, ado() across asyncio tasks on one loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.stats = {"calls": 0, "shared": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["calls"] += 1
+            else:
+                self.stats["shared"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, fn, *args, **kwargs):
+        """Like do() for a coroutine function; the shared call runs as its own
+        task so one waiter being cancelled doesn't cancel it for the others"""
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = loop.create_task(fn(*args, **kwargs))
+                task.add_done_callback(lambda _: self._forget(task_key))
+                self.stats["calls"] += 1
+            else:
+                self.stats["shared"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def saved(self) -> float:
+        """Fraction of calls that were served by another caller's request"""
+        total = self.stats["calls"] + self.stats["shared"]
+        return self.stats["shared"] / total if total else 0.0
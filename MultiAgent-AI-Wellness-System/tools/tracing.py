@@ -0,0 +1,303 @@
+# Lightweight tracing spans with JSON-lines and OTLP export
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import math
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import defaultdict, deque
+
+from app.config import settings
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation. Parent/child links follow the active context,
+    so spans nest across asyncio tasks and asyncio.to_thread workers."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attrs", "error", "_t0", "_token")
+
+    def __init__(self, name: str, parent=None, **attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.end = None
+        self.attrs = attrs
+        self.error = None
+        self._t0 = time.perf_counter()
+        self._token = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end - self.start) * 1000 if self.end else 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class JsonlExporter:
+    """Appends one JSON object per finished span"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def flush(self):
+        pass
+
+
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+class OtlpExporter:
+    """Sends spans to an OpenTelemetry collector over OTLP/HTTP (JSON).
+
+    Spans are queued and posted in batches from a background thread, so
+    export never adds latency to the traced request.
+    """
+
+    def __init__(self, endpoint: str, service_name: str, batch_size: int = 256, interval: float = 2.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=10000)
+        self._worker = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._worker.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # drop rather than block the request path
+
+    def _payload(self, spans) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "wellness.tracing"},
+                "spans": [{
+                    "traceId": s.trace_id,
+                    "spanId": s.span_id,
+                    **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                    "name": s.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(int(s.start * 1e9)),
+                    "endTimeUnixNano": str(int(s.end * 1e9)),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items() if v is not None],
+                    "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                } for s in spans],
+            }],
+        }]}
+
+    def _post(self, spans):
+        import httpx
+        try:
+            httpx.post(self.url, json=self._payload(spans), timeout=5)
+        except httpx.HTTPError:
+            pass  # tracing must never break the app
+
+    def _drain(self, block: bool):
+        spans = []
+        try:
+            if block:
+                spans.append(self._queue.get(timeout=self.interval))
+            while len(spans) < self.batch_size:
+                spans.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return spans
+
+    def _run(self):
+        while True:
+            spans = self._drain(block=True)
+            if spans:
+                self._post(spans)
+
+    def flush(self):
+        while spans := self._drain(block=False):
+            self._post(spans)
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    i = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[i]
+
+
+def summarize(durations: dict) -> dict:
+    """{name: [ms, ...]} -> {name: {count, p50_ms, p95_ms, p99_ms, max_ms}}"""
+    out = {}
+    for name, values in sorted(durations.items()):
+        values = sorted(values)
+        out[name] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3) if values else 0.0,
+        }
+    return out
+
+
+class Tracer:
+    """Creates spans, hands finished ones to the exporter and keeps recent
+    durations per span name for an in-process latency report."""
+
+    def __init__(self, exporter=None, enabled: bool = True, window: int = 10000):
+        self.exporter = exporter
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: deque(maxlen=self.window))
+
+    def start(self, name: str, **attrs) -> Span:
+        span = Span(name, _current.get(), **attrs)
+        span._token = _current.set(span)
+        return span
+
+    def finish(self, span: Span, error: BaseException | None = None):
+        span.end = span.start + (time.perf_counter() - span._t0)
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        if span._token is not None:
+            try:
+                _current.reset(span._token)
+            except ValueError:
+                # Finished from a different context than it started in
+                _current.set(None)
+            span._token = None
+        with self._lock:
+            self._durations[span.name].append(span.duration_ms)
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def span(self, name: str, **attrs):
+        return _SpanContext(self, name, attrs)
+
+    def observe(self, name: str, ms: float):
+        """Record a latency that isn't a span (e.g. time to first token) in the report"""
+        if self.enabled:
+            with self._lock:
+                self._durations[name].append(ms)
+
+    def traced(self, name: str):
+        """Decorator that wraps a sync or async function in a span"""
+        def wrap(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return wrap
+
+    def report(self) -> dict:
+        """p50/p95/p99 per span name over the recent window"""
+        with self._lock:
+            durations = {name: list(values) for name, values in self._durations.items()}
+        return summarize(durations)
+
+    def flush(self):
+        if self.exporter is not None:
+            self.exporter.flush()
+
+
+class _SpanContext:
+    def __init__(self, tracer: Tracer, name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span = None
+
+    def __enter__(self):
+        if not self.tracer.enabled:
+            self.span = Span(self.name, None, **self.attrs)  # still usable by callers, never recorded
+            return self.span
+        self.span = self.tracer.start(self.name, **self.attrs)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.tracer.enabled:
+            self.tracer.finish(self.span, exc)
+        return False
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def report_file(path: str) -> dict:
+    """p50/p95/p99 per span name from a JSON-lines trace file"""
+    durations = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                durations[span["name"]].append(span["duration_ms"])
+    return summarize(durations)
+
+
+def _make_exporter():
+    kind = settings.TRACE_EXPORTER
+    if kind == "jsonl":
+        os.makedirs(os.path.dirname(settings.TRACE_PATH) or ".", exist_ok=True)
+        return JsonlExporter(settings.TRACE_PATH)
+    if kind == "otlp":
+        return OtlpExporter(settings.OTLP_ENDPOINT, settings.TRACE_SERVICE_NAME)
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown TRACE_EXPORTER '{kind}', expected none, jsonl or otlp")
+
+
+tracer = Tracer(_make_exporter(), enabled=settings.TRACING_ENABLED)
+atexit.register(tracer.flush)
+
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else settings.TRACE_PATH
+    for name, s in report_file(path).items():
+        print(f"{name:40s} n={s['count']:<6d} p50={s['p50_ms']:9.1f}ms "
+              f"p95={s['p95_ms']:9.1f}ms p99={s['p99_ms']:9.1f}ms max={s['max_ms']:9.1f}ms")